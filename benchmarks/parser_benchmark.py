@@ -0,0 +1,68 @@
+"""Compare the speed of the backends extracting matches from round pages.
+
+Pages are read from the page cache, so at least one download must have been
+run before. Usage: python -m benchmarks.parser_benchmark [cache folder]
+"""
+
+import glob
+import gzip
+import os
+import sys
+import time
+
+from data_download.extractor import CELL_READERS, extract_match_rows
+from data_download.worldfootball import (
+    get_matches_table_from_page,
+    score_in_two_columns,
+    table_to_dataframe,
+)
+
+
+def load_cached_pages(cache_directory: str) -> list[bytes]:
+    pages = []
+    for path in sorted(glob.glob(os.path.join(cache_directory, "*", "*.html.gz"))):
+        with gzip.open(path, "rb") as file:
+            pages.append(file.read())
+    return pages
+
+
+def reference_rows(page: bytes) -> list[tuple]:
+    """Return the matches of a page as extracted by the original parsing path"""
+    df = score_in_two_columns(table_to_dataframe(get_matches_table_from_page(page)))
+    columns = ["Team 1", "Team 2", "Score Team 1", "Score Team 2"]
+    return list(df[columns].itertuples(index=False, name=None))
+
+
+def time_backend(pages: list[bytes], backend: str, repeat: int) -> float:
+    """Return the best time over repeat runs to extract all the pages"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for page in pages:
+            extract_match_rows(page, backend)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(cache_directory: str = "cached_pages", repeat: int = 3) -> None:
+    pages = load_cached_pages(cache_directory)
+    if not pages:
+        print(f"No cached pages found in {cache_directory}")
+        return
+
+    expected = [reference_rows(page) for page in pages]
+    print(f"{len(pages)} pages, best of {repeat} runs")
+    print(f"{'Backend':<8}{'Seconds':>10}{'Pages/s':>10}  Same output")
+    for backend in CELL_READERS:
+        same_output = all(
+            [row[:4] for row in extract_match_rows(page, backend)] == rows
+            for page, rows in zip(pages, expected)
+        )
+        seconds = time_backend(pages, backend, repeat)
+        print(
+            f"{backend:<8}{seconds:>10.3f}{len(pages) / seconds:>10.0f}  {same_output}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -0,0 +1,302 @@
+"""Time each stage of the pipeline on synthetic leagues of growing size.
+
+Every stage runs on the same inputs at each scale and reports the best time
+over a few runs, its throughput and its peak memory as traced by tracemalloc.
+The parsing stages replay round pages: the ones saved in a page cache when
+one is given, otherwise pages built from the synthetic matches.
+
+The timings can be saved as a baseline, and later runs compared with it:
+stages slower than the baseline by more than the given tolerance are reported
+as regressions, and make the command exit with status 1.
+
+Usage: python -m benchmarks.pipeline_benchmark [--scales small medium]
+    [--pages cached_pages] [--save-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import pandas as pd
+
+from benchmarks.parser_benchmark import load_cached_pages
+from benchmarks.synthetic import round_pages, synthetic_leagues
+from data_download.extractor import extract_match_rows
+from data_download.worldfootball import (
+    get_matches_table_from_page,
+    score_in_two_columns,
+    table_to_dataframe,
+)
+from data_elaboration.leaderboard_comparison import rate_df_from_results
+from data_elaboration.results import results_df_from_matches
+from data_visualization import rendering, tools
+
+BASELINE_FILE = os.path.join("benchmarks", "baselines.json")
+FIRST_SEASON = 2004
+PLOTS_DPI = 50
+
+
+@dataclass(frozen=True)
+class Scale:
+    """Size of the synthetic data a benchmark runs on.
+
+    Parameters
+    ----------
+    name : str
+        Name used in the reports and in the baselines.
+    leagues : int
+        Number of leagues.
+    seasons : int
+        Number of seasons per league, of 20 teams and 38 rounds each.
+    pages : int
+        Number of round pages replayed by the parsing stages.
+    """
+
+    name: str
+    leagues: int
+    seasons: int
+    pages: int
+
+
+SCALES = {
+    "small": Scale("small", leagues=1, seasons=5, pages=38),
+    "medium": Scale("medium", leagues=3, seasons=17, pages=190),
+    "large": Scale("large", leagues=6, seasons=40, pages=380),
+}
+
+
+@dataclass(frozen=True)
+class Stage:
+    """A stage of the pipeline, ready to be called on its inputs.
+
+    Parameters
+    ----------
+    name : str
+        Name of the function benchmarked.
+    function : Callable
+        Runs the stage once over all its inputs.
+    items : int
+        Number of items processed by a call, for the throughput.
+    unit : str
+        What the items are, like "pages" or "matches".
+    """
+
+    name: str
+    function: Callable[[], Any]
+    items: int
+    unit: str
+
+
+@dataclass(frozen=True)
+class Measure:
+    stage: str
+    seconds: float
+    items: int
+    unit: str
+    peak_mb: float
+
+    @property
+    def throughput(self) -> float:
+        return self.items / self.seconds
+
+
+def pipeline_stages(
+    scale: Scale, plots_folder: str, cached_pages: Optional[list[bytes]] = None
+) -> list[Stage]:
+    """Return the stages of the pipeline with their inputs at the given scale"""
+    leagues = synthetic_leagues(scale.leagues, scale.seasons, first_season=FIRST_SEASON)
+    last_season = FIRST_SEASON + scale.seasons - 1
+    first_league = next(iter(leagues.values()))
+    if cached_pages:
+        pages = cached_pages[: scale.pages]
+    else:
+        pages = round_pages(first_league, scale.pages)
+
+    all_matches = pd.concat(leagues.values(), ignore_index=True)
+    page_columns = all_matches[["Team 1", "Team 2", "Score"]]
+    matches = {league: score_in_two_columns(df) for league, df in leagues.items()}
+    results = {league: results_df_from_matches(df) for league, df in matches.items()}
+    rates = {
+        league: rate_df_from_results(df, FIRST_SEASON, last_season, league)
+        for league, df in results.items()
+    }
+    n_matches = len(all_matches)
+
+    def parse_tables() -> list[pd.DataFrame]:
+        return [table_to_dataframe(get_matches_table_from_page(page)) for page in pages]
+
+    def extract_rows() -> list:
+        return [extract_match_rows(page) for page in pages]
+
+    def split_scores() -> pd.DataFrame:
+        return score_in_two_columns(page_columns.copy())
+
+    def elaborate_results() -> list[pd.DataFrame]:
+        return [results_df_from_matches(df) for df in matches.values()]
+
+    def compare_leaderboards() -> list[pd.DataFrame]:
+        return [
+            rate_df_from_results(df, FIRST_SEASON, last_season, league)
+            for league, df in results.items()
+        ]
+
+    jobs = rendering.across_leagues_plot_jobs(
+        rates, FIRST_SEASON, last_season, dpi=PLOTS_DPI
+    )
+    for league, rates_df in rates.items():
+        jobs += rendering.league_plot_jobs(
+            rates_df, league, FIRST_SEASON, last_season, dpi=PLOTS_DPI
+        )
+
+    def render() -> list[str]:
+        plots_folder_before = tools.PLOTS_FOLDER
+        tools.PLOTS_FOLDER = plots_folder
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                return rendering.render_plots(jobs, workers=0, force=True)
+        finally:
+            tools.PLOTS_FOLDER = plots_folder_before
+
+    return [
+        Stage("table_to_dataframe", parse_tables, len(pages), "pages"),
+        Stage("extract_match_rows", extract_rows, len(pages), "pages"),
+        Stage("score_in_two_columns", split_scores, n_matches, "matches"),
+        Stage("results_df_from_matches", elaborate_results, n_matches, "matches"),
+        Stage("rate_df_from_results", compare_leaderboards, n_matches, "matches"),
+        Stage("render_plots", render, len(jobs), "plots"),
+    ]
+
+
+def measure(stage: Stage, repeat: int) -> Measure:
+    """Return the best time over repeat runs of the stage, and the peak
+    memory of one more run with tracemalloc on, so that tracing does not slow
+    down the timed runs"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage.function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        stage.function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Measure(stage.name, min(timings), stage.items, stage.unit, peak / 2**20)
+
+
+def find_regressions(
+    measures: dict[str, list[Measure]], baselines: dict, tolerance: float
+) -> list[str]:
+    """Return a description of the stages slower than their baseline by more
+    than the tolerance, as a fraction of the baseline time"""
+    regressions = []
+    for scale, scale_measures in measures.items():
+        for measure_ in scale_measures:
+            baseline = baselines.get(scale, {}).get(measure_.stage)
+            if baseline is None:
+                continue
+            ratio = measure_.seconds / baseline["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append(
+                    f"{scale} {measure_.stage}: {measure_.seconds:.3f}s, "
+                    f"{ratio:.2f}x the baseline of {baseline['seconds']:.3f}s"
+                )
+    return regressions
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baselines(measures: dict[str, list[Measure]], path: str) -> None:
+    """Save the measures as baselines, keeping the ones of the other scales"""
+    baselines = load_baselines(path)
+    for scale, scale_measures in measures.items():
+        baselines[scale] = {
+            measure_.stage: {
+                "seconds": round(measure_.seconds, 6),
+                "peak_mb": round(measure_.peak_mb, 3),
+            }
+            for measure_ in scale_measures
+        }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def print_measures(scale: Scale, measures: list[Measure], baselines: dict) -> None:
+    print(
+        f"\n{scale.name}: {scale.leagues} leagues x {scale.seasons} seasons, "
+        f"{scale.pages} pages"
+    )
+    print(f"{'Stage':<25}{'Seconds':>10}{'Items/s':>12}{'Peak MB':>10}{'Baseline':>10}")
+    for measure_ in measures:
+        baseline = baselines.get(scale.name, {}).get(measure_.stage)
+        baseline_text = f"{baseline['seconds']:.3f}" if baseline else "-"
+        print(
+            f"{measure_.stage:<25}{measure_.seconds:>10.3f}"
+            f"{measure_.throughput:>10.0f} {measure_.unit[0]}"
+            f"{measure_.peak_mb:>10.1f}{baseline_text:>10}"
+        )
+
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scales", nargs="+", choices=list(SCALES), default=["small", "medium"]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--pages", help="Page cache folder to replay instead of synthetic pages"
+    )
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Save the timings as the new baselines",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Slowdown over the baseline reported as a regression",
+    )
+    options = parser.parse_args(arguments)
+
+    cached_pages = load_cached_pages(options.pages) if options.pages else None
+    baselines = load_baselines(options.baseline)
+    measures = {}
+    with tempfile.TemporaryDirectory() as plots_folder:
+        for name in options.scales:
+            scale = SCALES[name]
+            stages = pipeline_stages(scale, plots_folder, cached_pages)
+            measures[name] = [measure(stage, options.repeat) for stage in stages]
+            print_measures(scale, measures[name], baselines)
+
+    if options.save_baseline:
+        save_baselines(measures, options.baseline)
+        print(f"\nBaselines saved in {options.baseline}")
+        return 0
+
+    regressions = find_regressions(measures, baselines, options.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        print("\n".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
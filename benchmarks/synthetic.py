@@ -0,0 +1,144 @@
+"""Synthetic leagues to exercise the pipeline without connecting to the web.
+
+Matches follow a double round robin schedule, with goals drawn from Poisson
+distributions depending on the attack and defence of the two teams and on a
+home advantage, which gives score distributions close to the real ones.
+"""
+
+import html
+
+import numpy as np
+import pandas as pd
+
+from data_download.constants import MATCHES_COLUMNS
+from data_storage.store import with_team_categories
+
+# Average goals of the home and away teams in the top European leagues
+HOME_GOALS = 1.5
+AWAY_GOALS = 1.15
+# Standard deviation of the attack and defence of the teams, in log scale
+STRENGTH_SPREAD = 0.25
+HALF_TIME_SHARE = 0.45
+
+
+def synthetic_leagues(
+    leagues: int = 3,
+    seasons: int = 17,
+    teams: int = 20,
+    first_season: int = 2004,
+    seed: int = 0,
+) -> dict[str, pd.DataFrame]:
+    """Return the matches of the given number of leagues and seasons, keyed by
+    league label, with the columns of the downloaded matches.
+
+    The "Score" column holds the raw score shown on the pages, like
+    '2:1 (1:0) ', as returned by table_to_dataframe."""
+    rng = np.random.default_rng(seed)
+    home, away = double_round_robin(teams)
+    n_rounds, per_round = home.shape
+    rounds = np.repeat(np.arange(1, n_rounds + 1), per_round)
+
+    output = {}
+    for league in range(1, leagues + 1):
+        label = f"League {league}"
+        names = np.array([f"{label} Team {team:02d}" for team in range(1, teams + 1)])
+        season_dfs = []
+        for season in range(first_season, first_season + seasons):
+            attack, defence = rng.normal(0, STRENGTH_SPREAD, size=(2, teams))
+            home_goals = rng.poisson(
+                HOME_GOALS * np.exp(attack[home] - defence[away]).ravel()
+            )
+            away_goals = rng.poisson(
+                AWAY_GOALS * np.exp(attack[away] - defence[home]).ravel()
+            )
+            season_dfs.append(
+                pd.DataFrame(
+                    {
+                        "Team 1": names[home.ravel()],
+                        "Team 2": names[away.ravel()],
+                        "Score": raw_scores(home_goals, away_goals, rng),
+                        "Score Team 1": home_goals.astype(np.int8),
+                        "Score Team 2": away_goals.astype(np.int8),
+                        "Season": np.full(len(rounds), season, dtype=np.int16),
+                        "Round": rounds.astype(np.int8),
+                    }
+                )
+            )
+        df = pd.concat(season_dfs, ignore_index=True)
+        output[label] = with_team_categories(df)[MATCHES_COLUMNS]
+    return output
+
+
+def double_round_robin(teams: int) -> tuple[np.ndarray, np.ndarray]:
+    """Return the home and away team indexes of a double round robin, as
+    arrays of shape rounds x matches per round.
+
+    The first half is built with the circle method and the second half
+    repeats it with home and away swapped."""
+    if teams % 2:
+        raise ValueError("The number of teams must be even")
+    circle = np.arange(teams)
+    home_rounds, away_rounds = [], []
+    for round_ in range(teams - 1):
+        pairs = np.column_stack([circle[: teams // 2], circle[::-1][: teams // 2]])
+        # Alternate home and away for the team fixed in the circle
+        if round_ % 2:
+            pairs[0] = pairs[0, ::-1]
+        home_rounds.append(pairs[:, 0])
+        away_rounds.append(pairs[:, 1])
+        circle = np.concatenate([circle[:1], np.roll(circle[1:], 1)])
+    home = np.array(home_rounds)
+    away = np.array(away_rounds)
+    return np.vstack([home, away]), np.vstack([away, home])
+
+
+def raw_scores(
+    home_goals: np.ndarray, away_goals: np.ndarray, rng: np.random.Generator
+) -> list[str]:
+    """Return the scores as shown on the pages, with the half time score"""
+    home_half = rng.binomial(home_goals, HALF_TIME_SHARE)
+    away_half = rng.binomial(away_goals, HALF_TIME_SHARE)
+    return [
+        f"{g1}:{g2} ({h1}:{h2}) "
+        for g1, g2, h1, h2 in zip(home_goals, away_goals, home_half, away_half)
+    ]
+
+
+def round_pages(df: pd.DataFrame, limit: int) -> list[bytes]:
+    """Return up to limit round pages laid out like the ones of
+    worldfootball.net, from the matches of synthetic_leagues"""
+    pages = []
+    for _, df_round in df.groupby(["Season", "Round"], sort=True):
+        if len(pages) == limit:
+            break
+        pages.append(round_page(df_round))
+    return pages
+
+
+def round_page(df_round: pd.DataFrame) -> bytes:
+    rows = []
+    for number, (team1, team2, score) in enumerate(
+        df_round[["Team 1", "Team 2", "Score"]].itertuples(index=False)
+    ):
+        date = "11/09/2004" if number == 0 else ""
+        team1, team2 = html.escape(team1), html.escape(team2)
+        rows.append(
+            "<tr>\n"
+            f"<td>{date}</td>\n"
+            "<td>20:45</td>\n"
+            f'<td align="right"><a href="/teams/{number}/" title="{team1}">'
+            f"{team1}</a></td>\n"
+            '<td align="center">-</td>\n'
+            f'<td><a href="/teams/{number}/" title="{team2}">{team2}</a></td>\n'
+            f'<td><a href="/report/{number}/" title="Match details">{score}</a>\n'
+            "</td>\n"
+            "<td></td>\n"
+            "</tr>"
+        )
+    return (
+        "<html><head><title>Round</title></head><body>\n"
+        '<div class="box"><table class="standard_tabelle" cellpadding="3" '
+        'cellspacing="1">\n' + "".join(rows) + "\n</table></div>\n"
+        '<table class="standard_tabelle"><tr><td>#</td><td>Team</td></tr></table>\n'
+        "</body></html>"
+    ).encode("utf-8")
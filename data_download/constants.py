@@ -0,0 +1,15 @@
+"""Constants shared by the download and the later stages, without any third
+party import so that the stages not downloading anything can use them."""
+
+MATCHES_COLUMNS = [
+    "Team 1",
+    "Team 2",
+    "Score",
+    "Score Team 1",
+    "Score Team 2",
+    "Season",
+    "Round",
+]
+
+# Cells replacing the score of aborted and not played matches
+VOID_SCORES = {" abor.": "aborted", " dnp": "not played"}
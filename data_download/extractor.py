@@ -0,0 +1,134 @@
+"""Extract the matches of a round from the page of worldfootball.net.
+
+The matches are listed in the first table of class "standard_tabelle". Its
+cells are read in order: scores are recognized first, any other cell holding
+a lowercase letter is a team name, and every other cell is ignored.
+"""
+
+import html
+from typing import NamedTuple
+
+import regex as re
+
+from data_download.constants import VOID_SCORES
+
+SCORE_PATTERN = re.compile(r"(\d+):(\d+) \(\d:\d\) ")
+DECISION_PATTERN = re.compile(r"(\d):(\d) dec.")
+TEAM_PATTERN = re.compile(r"[a-z]")
+SCHEDULED_PATTERN = re.compile(r"\s*-:-")
+
+TABLE_START_PATTERN = re.compile(
+    r"<table\b[^>]*\bclass\s*=\s*[\"'][^\"']*\bstandard_tabelle\b", re.IGNORECASE
+)
+TABLE_TAG_PATTERN = re.compile(r"<(/?)table\b[^>]*>", re.IGNORECASE)
+CELL_PATTERN = re.compile(r"<td\b[^>]*>(.*?)</td\s*>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+
+class MatchRow(NamedTuple):
+    team1: str
+    team2: str
+    goals1: int
+    goals2: int
+    status: str
+
+
+def extract_match_rows(page: bytes, backend: str = "scan") -> list[MatchRow]:
+    """Return the matches listed in the page of a round.
+
+    Parameters
+    ----------
+    page : bytes
+        The content of the page of the round.
+    backend : str, optional
+        How the cells of the table are read: "scan" looks for the table with
+        regular expressions, without building any document tree; "lxml" parses
+        the page with lxml; "bs4" uses BeautifulSoup like
+        get_matches_table_from_page. By default "scan".
+    """
+    return rows_from_cells(CELL_READERS[backend](page))
+
+
+def rows_from_cells(cells: list[str]) -> list[MatchRow]:
+    """Pair the team names with the scores found in the cells of the table"""
+    scores, teams = [], []
+    for cell in cells:
+        cell = cell.replace("\n", "")
+
+        match = SCORE_PATTERN.match(cell)
+        if match:
+            scores.append((int(match[1]), int(match[2]), "played"))
+            continue
+        match = DECISION_PATTERN.match(cell)
+        if match:
+            scores.append((int(match[1]), int(match[2]), "decided"))
+            continue
+        if cell in VOID_SCORES:
+            scores.append((0, 0, VOID_SCORES[cell]))
+            continue
+        # Matches yet to be played, kept to pair the teams with the right score
+        if SCHEDULED_PATTERN.match(cell):
+            scores.append((0, 0, "scheduled"))
+            continue
+
+        if TEAM_PATTERN.search(cell):
+            teams.append(cell)
+
+    if len(teams) != 2 * len(scores):
+        raise ValueError(
+            f"Found {len(teams)} team names for {len(scores)} scores in the table"
+        )
+    return [
+        MatchRow(team1, team2, *score)
+        for team1, team2, score in zip(teams[::2], teams[1::2], scores)
+    ]
+
+
+################################################################################
+# Backends reading the text of the cells of the matches table
+################################################################################
+def scan_cells(page: bytes) -> list[str]:
+    """Read the cells slicing the raw page between the tags of the table"""
+    text = page.decode("utf-8", errors="replace")
+    start = TABLE_START_PATTERN.search(text)
+    if start is None:
+        raise ValueError("No matches table in the page")
+
+    # Find the closing tag of the table, skipping the ones of nested tables
+    depth, end = 0, len(text)
+    for tag in TABLE_TAG_PATTERN.finditer(text, start.start()):
+        depth += -1 if tag[1] else 1
+        if depth == 0:
+            end = tag.start()
+            break
+
+    return [
+        html.unescape(TAG_PATTERN.sub("", cell))
+        for cell in CELL_PATTERN.findall(text, start.end(), end)
+    ]
+
+
+def lxml_cells(page: bytes) -> list[str]:
+    """Read the cells parsing the page with lxml"""
+    from lxml import html as lxml_html
+
+    tree = lxml_html.fromstring(page)
+    tables = tree.xpath(
+        "//table[contains(concat(' ', normalize-space(@class), ' '),"
+        " ' standard_tabelle ')]"
+    )
+    if not tables:
+        raise ValueError("No matches table in the page")
+    return [cell.text_content() for cell in tables[0].iter("td")]
+
+
+def bs4_cells(page: bytes) -> list[str]:
+    """Read the cells parsing the page with BeautifulSoup"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, "html.parser")
+    table = soup.find("table", class_="standard_tabelle")
+    return [cell.text for cell in table.find_all("td")]
+
+
+CELL_READERS = {"scan": scan_cells, "lxml": lxml_cells, "bs4": bs4_cells}
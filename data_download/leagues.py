@@ -0,0 +1,63 @@
+"""Registry of the leagues whose matches can be downloaded from worldfootball.net."""
+
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class League:
+    """A league played as a double round robin.
+
+    Parameters
+    ----------
+    label : str
+        Name of the league used in data frames, files and plots.
+    url_tag : str
+        Tag identifying the league in the URLs of worldfootball.net.
+    teams : tuple[tuple[int, int], ...]
+        Number of teams taking part in the league, as pairs (first season,
+        number of teams) sorted by season. The number holds from that season
+        until the one of the next pair.
+    """
+
+    label: str
+    url_tag: str
+    teams: tuple[tuple[int, int], ...]
+
+    def teams_in_season(self, season: int) -> int:
+        """Return the expected number of teams in the season starting in the
+        given year"""
+        teams = self.teams[0][1]
+        for first_season, number in self.teams:
+            if first_season <= season:
+                teams = number
+        return teams
+
+    def rounds_in_season(self, season: int) -> int:
+        """Return the expected number of rounds of a season"""
+        return rounds_from_teams(self.teams_in_season(season))
+
+
+def rounds_from_teams(teams: int) -> int:
+    """Return the rounds of a double round robin among the given teams"""
+    return 2 * (teams - 1)
+
+
+LEAGUES = {
+    league.label: league
+    for league in [
+        League("Serie A", "ita-serie-a", ((2004, 20),)),
+        League("Premier League", "eng-premier-league", ((2004, 20),)),
+        League("Ligue 1", "fra-ligue-1", ((2004, 20), (2023, 18))),
+        League("Bundesliga", "bundesliga", ((2004, 18),)),
+        League("La Liga", "esp-primera-division", ((2004, 20),)),
+        League("Championship", "eng-championship", ((2004, 24),)),
+    ]
+}
+
+
+def league_from_url_tag(url_tag: str) -> League:
+    """Return the league in the registry having the given URL tag"""
+    for league in LEAGUES.values():
+        if league.url_tag == url_tag:
+            return league
+    raise KeyError(f"No league with URL tag {url_tag}")
@@ -0,0 +1,154 @@
+"""Persistent cache of downloaded web pages, stored compressed on disk."""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Optional
+
+import requests
+
+from data_pipeline.instrumentation import METRICS
+
+
+class CacheMissError(Exception):
+    """Raised in offline mode when a page has never been downloaded"""
+
+
+@dataclass
+class PageCache:
+    """Cache of web pages keyed by URL.
+
+    Each page is stored gzip-compressed next to a small JSON file with its
+    validators (ETag and Last-Modified), so that pages that may still change
+    can be revalidated with a conditional request instead of a full download.
+    The metadata also records the day the page was last downloaded or
+    revalidated, so that a page can be known to hold its final content.
+
+    Parameters
+    ----------
+    directory : str, optional
+        Folder where the pages are stored, by default "cached_pages".
+    offline : bool, optional
+        If True, never connect to the web: cached pages are returned as they
+        are and a CacheMissError is raised for pages not in the cache.
+    """
+
+    directory: str = "cached_pages"
+    offline: bool = False
+
+    def get(
+        self,
+        url: str,
+        revalidate: bool = True,
+        session: Any = None,
+        final_after: Optional[date] = None,
+    ) -> bytes:
+        """Return the content of the page at the given url.
+
+        Cached pages are returned without any request unless revalidate is
+        True, in which case the server is asked whether the page changed.
+        Pages whose content cannot change after the final_after day are not
+        revalidated if they were downloaded or revalidated since that day.
+        """
+        cached = self.load(url)
+        if cached is not None and is_final(cached[1], final_after):
+            revalidate = False
+
+        if self.offline:
+            if cached is None:
+                raise CacheMissError(f"Page not in cache: {url}")
+            METRICS.count("cache hits")
+            return cached[0]
+
+        if cached is not None and not revalidate:
+            METRICS.count("cache hits")
+            return cached[0]
+
+        headers = {}
+        if cached is not None:
+            headers = validator_headers(cached[1])
+
+        response = (session or requests).get(url, headers=headers)
+        if cached is not None and response.status_code == 304:
+            METRICS.count("cache revalidated")
+            self.store_metadata(url, {**cached[1], "downloaded": today()})
+            return cached[0]
+
+        METRICS.count("cache misses")
+
+        response.raise_for_status()
+        self.store(url, response)
+        return response.content
+
+    def load(self, url: str) -> Optional[tuple[bytes, dict]]:
+        """Return content and metadata of a cached page, None if not cached"""
+        content_path, metadata_path = self.paths(url)
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+            with gzip.open(content_path, "rb") as file:
+                content = file.read()
+        except (FileNotFoundError, EOFError, gzip.BadGzipFile, ValueError):
+            return None
+        return content, metadata
+
+    def store(self, url: str, response: requests.Response) -> None:
+        """Save the content of a response together with its validators"""
+        content_path, _ = self.paths(url)
+        os.makedirs(os.path.dirname(content_path), exist_ok=True)
+
+        metadata = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "downloaded": today(),
+        }
+
+        # Write to temporary files first so that concurrent readers or an
+        # interrupted run never see a half written page
+        write_atomically(content_path, gzip.compress(response.content))
+        self.store_metadata(url, metadata)
+
+    def store_metadata(self, url: str, metadata: dict) -> None:
+        _, metadata_path = self.paths(url)
+        write_atomically(metadata_path, json.dumps(metadata).encode("utf-8"))
+
+    def paths(self, url: str) -> tuple[str, str]:
+        """Return the paths of the content and the metadata file of a url"""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        path = os.path.join(self.directory, key[:2], key)
+        return path + ".html.gz", path + ".json"
+
+
+def today() -> str:
+    return date.today().isoformat()
+
+
+def is_final(metadata: dict, final_after: Optional[date]) -> bool:
+    """Return true if the page was downloaded or revalidated on or after the
+    final_after day. Pages cached without the day are never final."""
+    downloaded = metadata.get("downloaded")
+    if final_after is None or downloaded is None:
+        return False
+    return date.fromisoformat(downloaded) >= final_after
+
+
+def validator_headers(metadata: dict) -> dict[str, str]:
+    """Return the headers for a conditional request given the page metadata"""
+    headers = {}
+    if metadata.get("etag"):
+        headers["If-None-Match"] = metadata["etag"]
+    if metadata.get("last_modified"):
+        headers["If-Modified-Since"] = metadata["last_modified"]
+    return headers
+
+
+def write_atomically(path: str, data: bytes) -> None:
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+    os.replace(temporary_path, path)
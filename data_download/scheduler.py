@@ -0,0 +1,199 @@
+"""Concurrent download of web pages with pooled connections and retries."""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data_download.page_cache import PageCache
+from data_pipeline.instrumentation import METRICS
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_REQUESTS_PER_SECOND = 10
+
+
+class DownloadError(Exception):
+    """Raised when a page could not be downloaded after all the retries"""
+
+
+@dataclass(frozen=True)
+class PageRequest:
+    """A page to fetch through the cache, see PageCache.get for the meaning of
+    revalidate and final_after"""
+
+    url: str
+    revalidate: bool = True
+    final_after: Optional[date] = None
+
+
+class HostRateLimiter:
+    """Space out the requests sent to the same host by a minimum interval"""
+
+    def __init__(self, requests_per_second: Optional[float]) -> None:
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self.next_slot: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+class DownloadScheduler:
+    """Download many pages concurrently under a single concurrency limit.
+
+    Every worker thread keeps its own keep-alive session, requests to the same
+    host are rate limited and throttled or failed responses (429 and 5xx) are
+    retried with exponential backoff. Pages go through the page cache, and
+    results are always returned in the same order as the requests.
+
+    Parameters
+    ----------
+    max_workers : int, optional
+        Maximum number of pages downloaded at the same time, by default 16.
+    requests_per_second : Optional[float], optional
+        Maximum number of requests per second sent to each host, by default
+        10. Use None for no limit.
+    max_retries : int, optional
+        Number of times a failed request is repeated, by default 4.
+    backoff : float, optional
+        Seconds to wait before the first retry, doubled at each further retry,
+        by default 0.5.
+    timeout : float, optional
+        Seconds after which a request is considered failed, by default 30.
+    cache : Optional[PageCache], optional
+        Cache the pages are read from and written to, by default the one in the
+        folder "cached_pages".
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        requests_per_second: Optional[float] = DEFAULT_REQUESTS_PER_SECOND,
+        max_retries: int = 4,
+        backoff: float = 0.5,
+        timeout: float = 30,
+        cache: Optional[PageCache] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.rate_limiter = HostRateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache or PageCache()
+        self.local = threading.local()
+
+    def fetch_all(self, page_requests: list[PageRequest]) -> list[bytes]:
+        """Return the content of the requested pages, in the same order"""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.fetch, page_requests))
+
+    def iter_fetch(
+        self, page_requests: list[PageRequest]
+    ) -> Iterator[tuple[int, bytes]]:
+        """Yield (position of the request, page content) as pages arrive.
+
+        At most twice as many pages as workers are downloaded ahead of the
+        consumer, so that a slow consumer does not make the pages pile up in
+        memory.
+        """
+        max_pending = 2 * self.max_workers
+        requests_iter = iter(enumerate(page_requests))
+        pending = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                for index, page_request in requests_iter:
+                    pending[executor.submit(self.fetch, page_request)] = index
+                    if len(pending) >= max_pending:
+                        break
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+
+    async def fetch_all_async(self, page_requests: list[PageRequest]) -> list[bytes]:
+        """Asyncio version of fetch_all, to be awaited within an event loop"""
+        semaphore = asyncio.Semaphore(self.max_workers)
+        loop = asyncio.get_running_loop()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            async def fetch(page_request: PageRequest) -> bytes:
+                async with semaphore:
+                    return await loop.run_in_executor(
+                        executor, self.fetch, page_request
+                    )
+
+            return await asyncio.gather(*[fetch(req) for req in page_requests])
+
+    def fetch(self, page_request: PageRequest) -> bytes:
+        """Return the content of a single page, read through the cache"""
+        return self.cache.get(
+            page_request.url,
+            revalidate=page_request.revalidate,
+            session=self,
+            final_after=page_request.final_after,
+        )
+
+    def get(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        """Send a GET request, retrying it when it fails or is throttled"""
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                failure = repr(error)
+                retry_after = None
+            else:
+                METRICS.observe("http request", time.perf_counter() - start)
+                METRICS.count(f"http status {response.status_code}")
+                if response.status_code not in RETRY_STATUS_CODES:
+                    METRICS.count("http bytes", len(response.content))
+                    return response
+                failure = f"status code {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt < self.max_retries:
+                METRICS.count("http retries")
+                time.sleep(self.retry_delay(attempt, retry_after))
+
+        METRICS.count("http failures")
+        raise DownloadError(
+            f"Download of {url} failed after {self.max_retries + 1} attempts: {failure}"
+        )
+
+    def retry_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = self.backoff * 2**attempt
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    @property
+    def session(self) -> requests.Session:
+        """Return the session of the current thread, creating it if needed"""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self.local.session = session
+        return session
@@ -1,123 +1,385 @@
 """Download matches data connecting to worldfootball.net."""
 
-from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    as_completed,
+    wait,
+)
 from dataclasses import dataclass
-from typing import Any
+from datetime import date
+from typing import Any, Iterator, Optional
 
+import numpy as np
 import pandas as pd
 import regex as re
-import requests
-from bs4 import BeautifulSoup
+
+from data_download.extractor import MatchRow, extract_match_rows
+from data_download.leagues import LEAGUES, league_from_url_tag, rounds_from_teams
+from data_download.scheduler import DownloadScheduler, PageRequest
+from data_pipeline.instrumentation import METRICS
+from data_elaboration.teams import TEAMS
+from data_storage.store import DataStore, matches_from_store
+
+WORLDFOOTBALL_URL = "https://www.worldfootball.net"
 
 
 ################################################################################
 # Download of matches data from different leagues
 ################################################################################
+
+
 def seriea_download(
-    starting_season: int = 2004, ending_season: int = 2020, save_to_excel: bool = True
+    starting_season: int = 2004,
+    ending_season: int = 2020,
+    save_to_excel: bool = False,
+    scheduler: Optional[DownloadScheduler] = None,
+    store: Optional[DataStore] = None,
 ) -> pd.DataFrame:
-    print("\nStarting the download of Serie A matches data...")
-    df = download_from_worldfootball("ita-serie-a", starting_season, ending_season)
-    if save_to_excel:
-        save_dataframe_to_excel(df, "Serie A")
-    return df
+    return leagues_download(
+        ["Serie A"], starting_season, ending_season, save_to_excel, scheduler, store
+    )["Serie A"]
 
 
 def premierleague_download(
-    starting_season: int = 2004, ending_season: int = 2020, save_to_excel: bool = True
+    starting_season: int = 2004,
+    ending_season: int = 2020,
+    save_to_excel: bool = False,
+    scheduler: Optional[DownloadScheduler] = None,
+    store: Optional[DataStore] = None,
 ) -> pd.DataFrame:
-    print("\nStarting the download of Premier League matches data...")
-    df = download_from_worldfootball(
-        "eng-premier-league", starting_season, ending_season
-    )
-    if save_to_excel:
-        save_dataframe_to_excel(df, "Premier League")
-    return df
+    return leagues_download(
+        ["Premier League"],
+        starting_season,
+        ending_season,
+        save_to_excel,
+        scheduler,
+        store,
+    )["Premier League"]
 
 
 def ligue1_download(
-    starting_season: int = 2004, ending_season: int = 2020, save_to_excel: bool = True
+    starting_season: int = 2004,
+    ending_season: int = 2020,
+    save_to_excel: bool = False,
+    scheduler: Optional[DownloadScheduler] = None,
+    store: Optional[DataStore] = None,
 ) -> pd.DataFrame:
-    print("\nStarting the download of Ligue 1 matches data...")
-    df = download_from_worldfootball("fra-ligue-1", starting_season, ending_season)
+    return leagues_download(
+        ["Ligue 1"], starting_season, ending_season, save_to_excel, scheduler, store
+    )["Ligue 1"]
+
+
+def leagues_download(
+    league_labels: list[str],
+    starting_season: int = 2004,
+    ending_season: int = 2020,
+    save_to_excel: bool = False,
+    scheduler: Optional[DownloadScheduler] = None,
+    store: Optional[DataStore] = None,
+) -> dict[str, pd.DataFrame]:
+    """Download the matches data of many leagues at once, keyed by league label.
+
+    The pages of all the leagues and seasons share the same scheduler, so that
+    they are downloaded concurrently under a single concurrency limit.
+
+    If a store is provided, leagues having all the requested seasons in the
+    store are read from it without any download, while the matches of the
+    other leagues are downloaded and saved in the store.
+    """
+    seasons = list(range(starting_season, ending_season + 1))
+    output = {}
+    if store is not None:
+        for label in league_labels:
+            if set(seasons) <= set(store.stored_seasons("matches", label)):
+                print(f"\nReading {label} matches data from the store...")
+                output[label] = matches_from_store(store, label, seasons)
+
+    to_download = [label for label in league_labels if label not in output]
+    if to_download:
+        print(f"\nStarting the download of {', '.join(to_download)} matches data...")
+        url_tags = [LEAGUES[label].url_tag for label in to_download]
+        dfs = download_leagues_from_worldfootball(
+            url_tags, starting_season, ending_season, scheduler
+        )
+        for label, url_tag in zip(to_download, url_tags):
+            output[label] = dfs[url_tag]
+            if store is not None:
+                store.save("matches", output[label], label)
+
     if save_to_excel:
-        save_dataframe_to_excel(df, "Ligue 1")
-    return df
+        for label in league_labels:
+            save_dataframe_to_excel(output[label], label)
+    return {label: output[label] for label in league_labels}
 
 
 ################################################################################
 # Construction of the download process
 ################################################################################
 def download_from_worldfootball(
-    league_url_tag: str, starting_season: int, ending_season: int
+    league_url_tag: str,
+    starting_season: int,
+    ending_season: int,
+    scheduler: Optional[DownloadScheduler] = None,
+    parse_workers: Optional[int] = None,
 ) -> pd.DataFrame:
-    output_df = None
-
-    seasons = [f"{x}-{x+1}" for x in range(starting_season, ending_season + 1)]
-
-    web_data = []
-    for season in seasons:
-        season_data = multithread_round_data(league_url_tag, season)
-        web_data.extend(season_data)
-
-    for page in web_data:
-        table_info = get_matches_table_from_page(page.page_response)
-
-        df = table_to_dataframe(table_info)
-        df = score_in_two_columns(df)
-        df = add_season_round_info_to_df(df, page.season_int, page.round_)
+    return download_leagues_from_worldfootball(
+        [league_url_tag], starting_season, ending_season, scheduler, parse_workers
+    )[league_url_tag]
+
+
+@METRICS.timed("stage download")
+def download_leagues_from_worldfootball(
+    league_url_tags: list[str],
+    starting_season: int,
+    ending_season: int,
+    scheduler: Optional[DownloadScheduler] = None,
+    parse_workers: Optional[int] = None,
+    parser_backend: str = "scan",
+    discover_rounds: bool = True,
+) -> dict[str, pd.DataFrame]:
+    """Download the matches of the given seasons of many leagues.
+
+    Pages are read through the cache of the scheduler, which by default lives
+    in the folder "cached_pages". Pass a DownloadScheduler with
+    PageCache(offline=True) to work on cached pages only.
+
+    Each page is handed to a pool of parse_workers processes as soon as it is
+    downloaded, so that parsing overlaps with the download of the other pages.
+    By default one process per CPU is used, 0 parses in the current process.
+    The parser_backend is passed to extractor.extract_match_rows.
+
+    The number of rounds of each season is read from its first round if
+    discover_rounds is True, otherwise it is taken from the leagues registry.
+    """
+    scheduler = scheduler or DownloadScheduler()
+
+    league_seasons = [
+        (league_url_tag, f"{x}-{x+1}")
+        for league_url_tag in league_url_tags
+        for x in range(starting_season, ending_season + 1)
+    ]
+    if discover_rounds:
+        rounds = discover_season_rounds(league_seasons, scheduler, parser_backend)
+    else:
+        rounds = registry_season_rounds(league_seasons)
+    pages = season_round_pages(rounds)
+
+    print(f"Requesting data for {len(pages)} rounds...")
+    page_rows = dict(
+        parse_pages_as_they_arrive(pages, scheduler, parse_workers, parser_backend)
+    )
 
-        if output_df is None:
-            output_df = df
-        else:
-            output_df = output_df.append(df)
+    # Pages are listed by league, season and round: filling the columns in the
+    # same order gives sorted data frames without any sorting
+    columns = {league_url_tag: MatchesColumns() for league_url_tag in league_url_tags}
+    for index, page in enumerate(pages):
+        columns[page.league_tag].add_page(
+            page_rows.pop(index), page.season_int, page.round_
+        )
 
-    output_df.sort_values(by=["Season", "Round"], ascending=[True, True], inplace=True)
     print("Data download completed!\n")
-    return output_df
+    return {
+        tag: league_columns.to_dataframe() for tag, league_columns in columns.items()
+    }
+
+
+def parse_pages_as_they_arrive(
+    pages: list["RoundPage"],
+    scheduler: DownloadScheduler,
+    parse_workers: Optional[int] = None,
+    parser_backend: str = "scan",
+) -> Iterator[tuple[int, list[MatchRow]]]:
+    """Yield (position of the page, matches in the page) as pages are parsed"""
+    page_requests = [page.request for page in pages]
+    if parse_workers == 0:
+        for index, content in scheduler.iter_fetch(page_requests):
+            yield index, parsed_rows(extract_timed(content, parser_backend))
+        return
+
+    parse_workers = parse_workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        # Keep the number of pages waiting to be parsed bounded, so that the
+        # memory used does not grow with the number of pages
+        max_pending = 2 * parse_workers
+        pending = {}
+        for index, content in scheduler.iter_fetch(page_requests):
+            future = executor.submit(extract_timed, content, parser_backend)
+            pending[future] = index
+            del content
+
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), parsed_rows(future.result())
+
+        for future in as_completed(pending):
+            yield pending[future], parsed_rows(future.result())
+
+
+def extract_timed(page: bytes, parser_backend: str) -> tuple[list[MatchRow], float]:
+    """Extract the matches of a page, also returning the seconds it took, so
+    that pages parsed in worker processes can be timed by the parent"""
+    start = time.perf_counter()
+    rows = extract_match_rows(page, parser_backend)
+    return rows, time.perf_counter() - start
+
+
+def parsed_rows(timed_rows: tuple[list[MatchRow], float]) -> list[MatchRow]:
+    """Record the parse time of a page and return its matches"""
+    rows, seconds = timed_rows
+    METRICS.observe("page parse", seconds)
+    METRICS.count("pages parsed")
+    METRICS.count("matches parsed", len(rows))
+    return rows
+
+
+class MatchesColumns:
+    """Columns of a matches data frame, filled one page at a time.
+
+    The data frame is built once at the end, with team columns interned as
+    categoricals of the team IDs and small integer types for the numbers.
+    """
+
+    def __init__(self) -> None:
+        self.team1, self.team2, self.goals1, self.goals2 = [], [], [], []
+        self.seasons, self.rounds = [], []
+
+    def add_page(self, rows: list[MatchRow], season: int, round_: int) -> None:
+        """Add the matches of a page, skipping the ones not played yet"""
+        rows = [row for row in rows if row.status != "scheduled"]
+        for row in rows:
+            self.team1.append(row.team1)
+            self.team2.append(row.team2)
+            self.goals1.append(row.goals1)
+            self.goals2.append(row.goals2)
+        self.seasons.append(np.full(len(rows), season, dtype=np.int16))
+        self.rounds.append(np.full(len(rows), round_, dtype=np.int8))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        goals1 = np.array(self.goals1, dtype=np.int8)
+        goals2 = np.array(self.goals2, dtype=np.int8)
+        team1, team2 = TEAMS.categoricals(self.team1, self.team2)
+        return pd.DataFrame(
+            {
+                "Team 1": team1,
+                "Team 2": team2,
+                "Score": [f"{g1}:{g2}" for g1, g2 in zip(self.goals1, self.goals2)],
+                "Score Team 1": goals1,
+                "Score Team 2": goals2,
+                "Season": concatenate_or_empty(self.seasons, np.int16),
+                "Round": concatenate_or_empty(self.rounds, np.int8),
+            }
+        )
+
+
+def concatenate_or_empty(arrays: list[np.ndarray], dtype: type) -> np.ndarray:
+    if not arrays:
+        return np.array([], dtype=dtype)
+    return np.concatenate(arrays)
 
 
 # ---------------------------------
 # Connect to the web and request data
 # ---------------------------------
 @dataclass
-class MatchPageResponse:
+class RoundPage:
+    league_tag: str
     season_label: str
     round_: int
-    page_response: requests.Response
 
     @property
     def season_int(self):
         return int(self.season_label.split("-")[0])
 
-
-def multithread_round_data(league_tag: str, season: Any) -> list[MatchPageResponse]:
-    output = []
-    # Execute our get_data in multiple threads each having a different page number
-    with ThreadPoolExecutor(max_workers=38) as executor:
-        [
-            executor.submit(get_season_round_page, league_tag, season, round_, output)
-            for round_ in range(1, 39)
-        ]
+    @property
+    def request(self) -> PageRequest:
+        # Pages of closed seasons never change: once downloaded after the end
+        # of the season there is no need to ask the server again, while pages
+        # downloaded before it may miss late or postponed matches
+        return PageRequest(
+            round_page_url(self.league_tag, self.season_label, self.round_),
+            final_after=season_closing_date(self.season_label),
+        )
+
+
+def season_round_pages(season_rounds: dict[tuple[str, str], int]) -> list[RoundPage]:
+    """List the pages of all the rounds of the given leagues and seasons.
+
+    season_rounds holds the number of rounds keyed by (league URL tag, season
+    label), as returned by discover_season_rounds."""
+    return [
+        RoundPage(league_tag, season, round_)
+        for (league_tag, season), rounds in season_rounds.items()
+        for round_ in range(1, rounds + 1)
+    ]
+
+
+def discover_season_rounds(
+    league_seasons: list[tuple[str, str]],
+    scheduler: DownloadScheduler,
+    parser_backend: str = "scan",
+) -> dict[tuple[str, str], int]:
+    """Return the number of rounds of each (league URL tag, season label).
+
+    All the teams play in the first round, so the number of its matches gives
+    the number of teams and then of rounds. The leagues registry is used when
+    the first round lists no match."""
+    first_rounds = [
+        RoundPage(league_tag, season, 1) for league_tag, season in league_seasons
+    ]
+    contents = scheduler.fetch_all([page.request for page in first_rounds])
+
+    output = {}
+    for page, content in zip(first_rounds, contents):
+        matches = len(extract_match_rows(content, parser_backend))
+        if matches:
+            rounds = rounds_from_teams(2 * matches)
+        else:
+            league = league_from_url_tag(page.league_tag)
+            rounds = league.rounds_in_season(page.season_int)
+        output[(page.league_tag, page.season_label)] = rounds
     return output
 
 
-def get_season_round_page(
-    league_tag: str, season: Any, round_: Any, req_list: list
-) -> None:
-    """Get the page for a round in a given season"""
-    url = f"https://www.worldfootball.net/schedule/{league_tag}-{season}-spieltag/{round_}/"
-    response = requests.get(url)
-    req_list.append(MatchPageResponse(season, round_, response))
-    print(f"Requesting data from season {season}, round {round_}...")
+def registry_season_rounds(
+    league_seasons: list[tuple[str, str]]
+) -> dict[tuple[str, str], int]:
+    """Return the number of rounds of each (league URL tag, season label) as
+    expected from the leagues registry"""
+    return {
+        (league_tag, season): league_from_url_tag(league_tag).rounds_in_season(
+            int(season.split("-")[0])
+        )
+        for league_tag, season in league_seasons
+    }
+
+
+def round_page_url(league_tag: str, season: Any, round_: Any) -> str:
+    return f"{WORLDFOOTBALL_URL}/schedule/{league_tag}-{season}-spieltag/{round_}/"
+
+
+def season_is_closed(season_label: str, today: Optional[date] = None) -> bool:
+    """Return true if the season in the form '2020-2021' is over for sure"""
+    return (today or date.today()) >= season_closing_date(season_label)
+
+
+def season_closing_date(season_label: str) -> date:
+    """Return the day the season in the form '2020-2021' is over for sure"""
+    ending_year = int(season_label.split("-")[1])
+    return date(ending_year, 7, 1)
 
 
 # ---------------------------------
 # Elaborate the data downloaded from the web
 # ---------------------------------
-def get_matches_table_from_page(page: requests.Response) -> list:
+def get_matches_table_from_page(page: bytes) -> list:
     """Retrive desired table info from target page"""
-    soup = BeautifulSoup(page.content, "html.parser")
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page, "html.parser")
     table = soup.find("table", class_="standard_tabelle")
     return table.find_all("td")
 
@@ -136,10 +398,15 @@ def table_to_dataframe(page_table: list) -> pd.DataFrame:
         if text_is_team(element):
             teams_info.append(element)
 
-    team1 = teams_info[::2]
-    team2 = teams_info[1::2]
+    team1, team2 = TEAMS.categoricals(teams_info[::2], teams_info[1::2])
 
-    return pd.DataFrame({"Team 1": team1, "Team 2": team2, "Score": scores_info})
+    return pd.DataFrame(
+        {
+            "Team 1": team1,
+            "Team 2": team2,
+            "Score": scores_info,
+        }
+    )
 
 
 def text_is_team(input_text):
@@ -171,9 +438,14 @@ def add_season_round_info_to_df(
 
 
 def score_in_two_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df["Score"] = df["Score"].apply(lambda x: x.split(" ")[0])
-    df["Score Team 1"] = df["Score"].apply(lambda x: int(x.split(":")[0]))
-    df["Score Team 2"] = df["Score"].apply(lambda x: int(x.split(":")[1]))
+    # Parse each distinct score only once, then spread it over the matches
+    codes, unique_scores = pd.factorize(df["Score"])
+    unique_scores = pd.Series(unique_scores).str.split(" ", n=1).str[0]
+    goals = unique_scores.str.split(":", expand=True).astype(np.int8).to_numpy()
+
+    df["Score"] = unique_scores.to_numpy()[codes]
+    df["Score Team 1"] = goals[codes, 0]
+    df["Score Team 2"] = goals[codes, 1]
     return df
 
 
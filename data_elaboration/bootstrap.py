@@ -0,0 +1,129 @@
+"""Bootstrap confidence bands for the median similarity rates per round."""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from data_elaboration.rates_index import RatesIndex
+from data_pipeline.instrumentation import METRICS
+
+CHUNK_SIZE = 500
+
+
+@dataclass
+class MedianBands:
+    """Confidence bands of the median rates of a RatesIndex.
+
+    lower and upper are arrays of shape leagues x tolerances x rounds, laid out
+    like the first three axes of the rates of the index they come from, with
+    NaN where a round has no rates.
+    """
+
+    leagues: list[str]
+    tolerances: np.ndarray
+    rounds: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    level: float
+    resamples: int
+
+    def band(
+        self, league: str, tolerance: int, rounds: list[int]
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the lower and upper bounds of the median for each round"""
+        league_position = self.leagues.index(league)
+        tolerance_position = int(np.flatnonzero(self.tolerances == tolerance)[0])
+        positions = np.searchsorted(self.rounds, rounds)
+        positions = np.minimum(positions, len(self.rounds) - 1)
+        found = self.rounds[positions] == np.asarray(rounds)
+
+        bounds = []
+        for bound in [self.lower, self.upper]:
+            values = bound[league_position, tolerance_position, positions]
+            bounds.append(np.where(found, values, np.nan))
+        return bounds[0], bounds[1]
+
+
+@METRICS.timed("stage bootstrap")
+def bootstrap_median_bands(
+    index: RatesIndex,
+    resamples: int = 10_000,
+    level: float = 0.95,
+    seed: Optional[int] = None,
+    workers: Optional[int] = 0,
+) -> MedianBands:
+    """Return percentile bootstrap bands for the median rate of every league,
+    tolerance and round, resampling the seasons with replacement.
+
+    The rates are sorted once per round; each resample is then a vector of
+    counts of the seasons, and its medians are read off the cumulative counts
+    along the sorted seasons, for all the rounds at once. Resamples are drawn
+    in chunks with their own random streams spawned from seed, so that the
+    output only depends on the seed. With workers > 0 the chunks are split
+    among that many processes, with None among one process per CPU.
+    """
+    values = index.rates.reshape(-1, len(index.seasons))
+    order = np.argsort(values, axis=1)  # NaN go last
+    sorted_values = np.take_along_axis(values, order, axis=1)
+
+    chunks = [CHUNK_SIZE] * (resamples // CHUNK_SIZE)
+    if resamples % CHUNK_SIZE:
+        chunks.append(resamples % CHUNK_SIZE)
+    streams = np.random.SeedSequence(seed).spawn(len(chunks))
+    arguments = ([sorted_values] * len(chunks), [order] * len(chunks), chunks, streams)
+
+    if workers == 0:
+        medians = list(map(resampled_medians, *arguments))
+    else:
+        max_workers = os.cpu_count() if workers is None else workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            medians = list(executor.map(resampled_medians, *arguments))
+    medians = np.concatenate(medians)
+
+    with warnings.catch_warnings():
+        # Rounds without any rate give NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        lower, upper = np.nanquantile(
+            medians, [(1 - level) / 2, (1 + level) / 2], axis=0
+        )
+    shape = index.rates.shape[:3]
+    return MedianBands(
+        leagues=index.leagues,
+        tolerances=index.tolerances,
+        rounds=index.rounds,
+        lower=lower.reshape(shape),
+        upper=upper.reshape(shape),
+        level=level,
+        resamples=resamples,
+    )
+
+
+def resampled_medians(
+    sorted_values: np.ndarray,
+    order: np.ndarray,
+    resamples: int,
+    stream: np.random.SeedSequence,
+) -> np.ndarray:
+    """Return the medians of each row of values for a chunk of resamples, as
+    an array of shape resamples x rows.
+
+    sorted_values holds each row of values sorted, with NaN last, and order
+    the positions of the sorted values in the original rows."""
+    rng = np.random.default_rng(stream)
+    n_rows, n_seasons = sorted_values.shape
+    counts = rng.multinomial(n_seasons, np.full(n_seasons, 1 / n_seasons), resamples)
+
+    # Times each sorted value is drawn: resamples x rows x seasons
+    sorted_counts = counts[:, order] * ~np.isnan(sorted_values)
+    cumulative_counts = sorted_counts.cumsum(axis=2)
+    drawn = cumulative_counts[:, :, -1]
+
+    medians = np.zeros((resamples, n_rows))
+    for middle in [(drawn + 1) // 2, drawn // 2 + 1]:
+        positions = (cumulative_counts < middle[:, :, np.newaxis]).sum(axis=2)
+        positions = np.minimum(positions, n_seasons - 1)
+        medians += sorted_values[np.arange(n_rows), positions] / 2
+    return np.where(drawn > 0, medians, np.nan)
@@ -1,80 +1,150 @@
 """Class to represent a leaderboard for a given season at a given round."""
-from typing import Union
+from typing import Optional, Union
+
+import numpy as np
 import pandas as pd
 
+from data_elaboration.standings import RanksRange, SeasonStandings, rank_range_mask
+from data_elaboration.teams import TEAM_ID_DTYPE, TEAMS
+
 
 class Leaderboard:
+    __slots__ = ("season", "round", "team_ids", "points", "ranks")
+
     def __init__(
         self,
-        results: pd.DataFrame,
+        results: Union[pd.DataFrame, SeasonStandings],
         season: int,
-        round: int = 38,
-        ranks_range: tuple[Union[None, int], Union[None, int]] = (None, None),
+        round: Optional[int] = None,
+        ranks_range: RanksRange = (None, None),
     ) -> None:
         """Represent a leaderboard for a given season at a given round.
 
+        The leaderboard is held as three arrays sorted by rank: the IDs of the
+        teams in the team registry, their points and their ranks. The data
+        frame and dictionary views are built only when requested.
+
         Parameters
         ----------
-        results : pd.DataFrame
-            Pandas data frame with columns for team, season, round and points.
+        results : Union[pd.DataFrame, SeasonStandings]
+            Pandas data frame with columns for team, season, round and points,
+            or the precomputed standings of the season. In the latter case the
+            leaderboard is just a view over the standings at the given round.
         season : int
             The starting year of the season the leaderboard should be constructed
             for.
-        round : int, optional
-            The round the leaderboard should be constructed for, by default 38.
-        ranks_range : tuple[Union[None, int], Union[None, int]], optional
+        round : Optional[int], optional
+            The round the leaderboard should be constructed for, by default the
+            last round of the season found in the results.
+        ranks_range : RanksRange, optional
             If not (None, None), it restricts the leaderboard only to include
             the ranks in the provided range. The range is inclusive on both
-            sides. Use a single None for a one-sided interval.
+            sides. Use a single None for a one-sided interval, and negative
+            ranks to count from the bottom, e.g. (-3, None) for the last three.
         """
         self.season = season
         self.round = round
-        self.table_as_df = self.make_leaderboard(results, ranks_range)
-        self.table_as_dict = self.make_dictionary()
+        if round is None:
+            self.round = self.last_round(results)
+        if isinstance(results, SeasonStandings):
+            team_ids, points, ranks = self.leaderboard_from_standings(results)
+        else:
+            team_ids, points, ranks = self.make_leaderboard(results)
+
+        mask = rank_range_mask(ranks, ranks_range, len(ranks))
+        order = np.argsort(ranks[mask], kind="stable")
+        self.team_ids = team_ids[mask][order].astype(TEAM_ID_DTYPE)
+        self.points = points[mask][order].astype(np.float32)
+        self.ranks = ranks[mask][order].astype(np.float32)
+
+    @property
+    def table_as_df(self) -> pd.DataFrame:
+        """Return a data frame with columns ["Team", "Points earned", "Rank"]"""
+        return pd.DataFrame(
+            {
+                "Team": TEAMS.names_of(self.team_ids),
+                "Points earned": self.points,
+                "Rank": self.ranks,
+            }
+        )
+
+    @property
+    def table_as_dict(self) -> dict[str, float]:
+        """Return a dict of the form {team : rank}"""
+        return self.make_dictionary()
 
     @property
     def teams_list(self) -> list[str]:
         """Return the list of teams in the leaderboard"""
-        return list(self.table_as_dict.keys())
+        return TEAMS.names_of(self.team_ids).tolist()
 
     @property
-    def ranks_list(self) -> list[int]:
+    def ranks_list(self) -> list[float]:
         """Return the list of ranks in the leaderboard"""
-        return list(self.table_as_dict.values())
+        return self.ranks.tolist()
 
-    def make_leaderboard(self, df: pd.DataFrame, ranks_range: tuple) -> pd.DataFrame:
-        """Create data frame with columns ["Team", "Points Earned", "Rank"]"""
+    def make_leaderboard(
+        self, df: pd.DataFrame
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sum the points earned by each team up to the round and rank them"""
         df = self.relevant_season_rounds_only(df)
 
-        df = df.groupby(["Team"], as_index=False).agg({"Points earned": "sum"})
-        df["Rank"] = df["Points earned"].rank(method="min", ascending=False)
+        team_ids = TEAMS.intern(df["Team"])
+        unique_ids, positions = np.unique(team_ids, return_inverse=True)
+        points = np.bincount(
+            positions, weights=df["Points earned"].to_numpy(), minlength=len(unique_ids)
+        )
+        ranks = pd.Series(points).rank(method="min", ascending=False).to_numpy()
+        return unique_ids, points, ranks
 
-        df = self.desired_ranks_only(df, ranks_range)
+    def leaderboard_from_standings(
+        self, standings: SeasonStandings
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Read the teams, points and ranks at the round from the standings"""
+        position = standings.round_position(self.round)
+        return (
+            standings.team_ids,
+            standings.cumulative_points[:, position],
+            standings.ranks[:, position],
+        )
 
-        df = df.sort_values(by=["Rank"], ascending=True)
-        return df
+    def last_round(self, results: Union[pd.DataFrame, SeasonStandings]) -> int:
+        """Return the last round of the season found in the results"""
+        if isinstance(results, SeasonStandings):
+            return results.last_round
+        return int(results.loc[results["Season"] == self.season, "Round"].max())
 
     def relevant_season_rounds_only(self, df: pd.DataFrame) -> pd.DataFrame:
         """Filters out from the df the results relevant for the leaderboard"""
         filter_ = (df["Season"] == self.season) & (df["Round"] <= self.round)
         return df.loc[filter_, :]
 
-    @staticmethod
-    def desired_ranks_only(df: pd.DataFrame, ranks_range: tuple):
-        min_rank, max_rank = ranks_range
-        if min_rank is not None:
-            df = df.loc[df["Ranks"] >= min_rank, :].copy()
-        if max_rank is not None:
-            df = df.loc[df["Ranks"] <= max_rank, :].copy()
-        return df
-
     def make_dictionary(self) -> dict[str:int]:
         """Return a dict of the form {team : rank}"""
-        return {
-            team: score
-            for team, score in zip(self.table_as_df["Team"], self.table_as_df["Rank"])
-        }
+        return dict(zip(self.teams_list, self.ranks_list))
 
     def get_rank_from_team(self, team: str) -> int:
         """Return the rank of a given team provided its name"""
-        return self.table_as_dict[team]
+        team_id = TEAMS.ids.get(team)
+        if team_id is None:
+            raise KeyError(team)
+        return self.get_rank_from_id(team_id)
+
+    def get_rank_from_id(self, team_id: int) -> float:
+        """Return the rank of a given team provided its ID"""
+        return float(self.ranks_of_ids(np.array([team_id]))[0])
+
+    def ranks_of_ids(self, team_ids: np.ndarray) -> np.ndarray:
+        """Return the ranks of many teams given their IDs"""
+        team_ids = np.asarray(team_ids)
+        if not len(self.team_ids):
+            if len(team_ids):
+                raise KeyError(TEAMS.names_of(team_ids).tolist())
+            return self.ranks[:0]
+        order = np.argsort(self.team_ids)
+        positions = np.searchsorted(self.team_ids, team_ids, sorter=order)
+        positions = order[np.minimum(positions, len(order) - 1)]
+        found = self.team_ids[positions] == team_ids
+        if not found.all():
+            raise KeyError(TEAMS.names_of(team_ids[~found]).tolist())
+        return self.ranks[positions]
@@ -1,30 +1,288 @@
 """Functions to derive similarity rates from different leaderboard objects."""
-from collections import namedtuple
-from statistics import mean
+from typing import Iterable, Optional, Union
 
+import numpy as np
 import pandas as pd
 
 from data_elaboration.leaderboard import Leaderboard
+from data_elaboration.rank_metrics import RANK_METRICS
+from data_elaboration.standings import (
+    RanksRange,
+    SeasonStandings,
+    rank_range_mask,
+    season_standings,
+)
+from data_pipeline.instrumentation import METRICS
 
+SIMILARITY_RATE = "Similarity rate"
 
+
+@METRICS.timed("stage rates")
 def rate_df_from_results(
-    df_results: pd.DataFrame, start_season: int, end_season: int, league_label: str
+    df_results: pd.DataFrame,
+    start_season: int,
+    end_season: int,
+    league_label: str,
+    tolerances: Iterable[int] = range(0, 3),
+    metrics: Iterable[str] = (),
+    ranks_range: RanksRange = (None, None),
+) -> pd.DataFrame:
+    """Return the similarity rates of the leaderboard of every round with the
+    final one, for each season and tolerance.
+
+    With ranks_range, only the teams ending the season in that range of ranks
+    are compared, e.g. (None, 4) for the top 4 or (-3, None) for the last 3.
+
+    metrics names further measures from rank_metrics.RANK_METRICS to compute on
+    the same standings. With any of them, the output gets a "Metric" column,
+    "Similarity rate" for the rows of the tolerances, and the values of the
+    other metrics appear in the "Rate" column with a missing tolerance."""
+    tolerances = np.asarray(tolerances)
+    metrics = list(metrics)
+    standings = season_standings(df_results)
+
+    season_ranks = []
+    for season in range(start_season, end_season + 1):
+        season_standing = standings[season]
+        last_round = season_standing.last_round
+        rounds = np.arange(1, last_round)
+
+        final_ranks = season_standing.ranks_at_round(last_round)
+        partial_ranks = season_standing.ranks[
+            :, season_standing.round_positions(rounds)
+        ]
+        season_ranks.append((season, rounds, partial_ranks.T, final_ranks))
+
+    # All the rounds of all the seasons are compared with a single call
+    partial_ranks, final_ranks, teams_mask = stack_season_ranks(season_ranks)
+    n_teams = teams_mask.sum(axis=1, keepdims=True)
+    teams_mask &= rank_range_mask(final_ranks, ranks_range, n_teams)
+    rates = similarity_rates(partial_ranks, final_ranks, tolerances, teams_mask)
+
+    seasons = np.concatenate([np.full(len(r), s) for s, r, _, _ in season_ranks])
+    rounds = np.concatenate([rounds for _, rounds, _, _ in season_ranks])
+    df_rates = pd.DataFrame(
+        {
+            "Serie": league_label,
+            "Season": np.repeat(seasons, len(tolerances)),
+            "Round": np.repeat(rounds, len(tolerances)),
+            "Tolerance": np.tile(tolerances, len(rounds)),
+            "Rate": rates.ravel(),
+        }
+    )
+    if not metrics:
+        return df_rates
+
+    df_rates["Tolerance"] = df_rates["Tolerance"].astype("Int64")
+    df_rates["Metric"] = SIMILARITY_RATE
+    df_metrics = metrics_df(season_ranks, metrics).assign(Serie=league_label)
+    return pd.concat([df_rates, df_metrics[df_rates.columns]], ignore_index=True)
+
+
+def stack_season_ranks(
+    season_ranks: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]],
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Stack the partial and final ranks of many seasons, given as tuples
+    (season, rounds, partial ranks, final ranks), in arrays of shape
+    rounds x teams.
+
+    Seasons with fewer teams are padded with rank 0, and the returned mask is
+    false for the padding."""
+    n_teams = max(len(final_ranks) for _, _, _, final_ranks in season_ranks)
+    n_rows = sum(len(partial_ranks) for _, _, partial_ranks, _ in season_ranks)
+    partial = np.zeros((n_rows, n_teams), dtype=np.int64)
+    final = np.zeros((n_rows, n_teams), dtype=np.int64)
+    teams_mask = np.zeros((n_rows, n_teams), dtype=bool)
+
+    start = 0
+    for _, _, partial_ranks, final_ranks in season_ranks:
+        rows, teams = partial_ranks.shape
+        partial[start : start + rows, :teams] = partial_ranks
+        final[start : start + rows, :teams] = final_ranks
+        teams_mask[start : start + rows, :teams] = True
+        start += rows
+    return partial, final, teams_mask
+
+
+def metrics_df(
+    season_ranks: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]],
+    metrics: list[str],
+) -> pd.DataFrame:
+    """Compute the metrics of many seasons, given as tuples (season, rounds,
+    partial ranks, final ranks).
+
+    Seasons with the same number of teams are stacked, so that each metric is
+    computed with a single call for all their rounds."""
+    season_groups = {}
+    for season, rounds, partial_ranks, final_ranks in season_ranks:
+        season_groups.setdefault(len(final_ranks), []).append(
+            (season, rounds, partial_ranks, final_ranks)
+        )
+
+    group_dfs = []
+    for group in season_groups.values():
+        rounds = np.concatenate([rounds for _, rounds, _, _ in group])
+        seasons = np.concatenate([np.full(len(rounds), s) for s, rounds, _, _ in group])
+        partial_ranks = np.concatenate([partial for _, _, partial, _ in group])
+        final_ranks = np.concatenate(
+            [np.broadcast_to(final, partial.shape) for _, _, partial, final in group]
+        )
+        values = np.column_stack(
+            [RANK_METRICS[metric](partial_ranks, final_ranks) for metric in metrics]
+        )
+        group_dfs.append(
+            pd.DataFrame(
+                {
+                    "Season": np.repeat(seasons, len(metrics)),
+                    "Round": np.repeat(rounds, len(metrics)),
+                    "Tolerance": pd.array([pd.NA] * values.size, dtype="Int64"),
+                    "Rate": values.ravel(),
+                    "Metric": np.tile(metrics, len(rounds)),
+                }
+            )
+        )
+    return pd.concat(group_dfs, ignore_index=True)
+
+
+def similarity_rates(
+    partial_ranks: np.ndarray,
+    final_ranks: np.ndarray,
+    tolerances: Iterable[int],
+    teams_mask: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Return the similarity rates of many leaderboards for many tolerances.
+
+    Parameters
+    ----------
+    partial_ranks : np.ndarray
+        Array of shape rounds x teams, each row holding the ranks of the teams
+        in one partial leaderboard.
+    final_ranks : np.ndarray
+        Array of shape teams, holding the ranks in the reference leaderboard,
+        or of shape rounds x teams to compare each row of partial_ranks with
+        its own reference. Teams must be in the same order as the columns of
+        partial_ranks.
+    tolerances : Iterable[int]
+        The tolerance levels the similarity rates should be computed for.
+    teams_mask : Optional[np.ndarray]
+        Boolean array of shape teams or rounds x teams. If given, only the
+        teams where it is true are compared, e.g. the ones of a zone of the
+        reference leaderboard. Rows without any such team get NaN.
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape rounds x tolerances with the similarity rates, as defined
+        in leaderboard_similarity_rate.
+    """
+    partial_ranks = np.atleast_2d(partial_ranks)
+    n_rows, n_teams = partial_ranks.shape
+    differences = np.abs(partial_ranks - final_ranks).astype(np.int64)
+
+    # Count how many teams have each rank difference in each row, offsetting
+    # the rows so that a single bincount covers the whole array. The
+    # cumulative counts then answer any tolerance with a lookup. Teams out of
+    # the mask fall in an extra bin, never counted. Ranks may come from
+    # tables larger than the teams compared, so the bins go up to the largest
+    # difference found rather than to the number of teams.
+    max_difference = max(n_teams - 1, int(differences.max(initial=0)))
+    if teams_mask is None:
+        compared_teams = np.full(n_rows, n_teams)
+    else:
+        teams_mask = np.broadcast_to(teams_mask, (n_rows, n_teams))
+        differences = np.where(teams_mask, differences, max_difference + 1)
+        compared_teams = teams_mask.sum(axis=1)
+    bins = max_difference + 2
+    offsets = np.arange(n_rows)[:, np.newaxis] * bins
+    counts = np.bincount(
+        (differences + offsets).ravel(), minlength=n_rows * bins
+    ).reshape(n_rows, bins)
+    similar_counts = counts.cumsum(axis=1)
+
+    tolerances = np.clip(np.asarray(tolerances), -1, max_difference)
+    rates = np.where(tolerances >= 0, similar_counts[:, tolerances], 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return rates / compared_teams[:, np.newaxis]
+
+
+def similarity_matrix_df_from_results(
+    df_results: pd.DataFrame,
+    start_season: int,
+    end_season: int,
+    league_label: str,
+    tolerances: Iterable[int] = range(0, 3),
 ) -> pd.DataFrame:
-    Rate_Record = namedtuple("Rate", ["Serie", "Season", "Round", "Tolerance", "Rate"])
+    """Return the similarity rates between the leaderboards of every pair of
+    rounds of each season, with the columns of rate_df_from_results plus
+    "Reference round"."""
+    tolerances = np.asarray(tolerances)
+    standings = season_standings(df_results)
 
-    rates = []
+    season_dfs = []
     for season in range(start_season, end_season + 1):
-        final_leaderboard = Leaderboard(df_results, season, 38)
-        for round_ in range(1, 38):
-            partial_leaderboard = Leaderboard(df_results, season, round_)
-            for numb in range(0, 3):
-                rate = leaderboard_similarity_rate(
-                    partial_leaderboard, final_leaderboard, tolerance=numb
-                )
-                rates.append(Rate_Record(league_label, season, round_, numb, rate))
+        season_standing = standings[season]
+        rounds = season_standing.rounds
+        matrix = round_similarity_matrix(season_standing, tolerances)
+        season_dfs.append(
+            pd.DataFrame(
+                {
+                    "Serie": league_label,
+                    "Season": season,
+                    "Reference round": np.repeat(rounds, len(rounds) * len(tolerances)),
+                    "Round": np.tile(np.repeat(rounds, len(tolerances)), len(rounds)),
+                    "Tolerance": np.tile(tolerances, len(rounds) ** 2),
+                    "Rate": matrix.ravel(),
+                }
+            )
+        )
+
+    return pd.concat(season_dfs, ignore_index=True)
+
 
-    df = pd.DataFrame.from_records(rates, columns=Rate_Record._fields)
-    return df
+def round_similarity_matrix(
+    standings: SeasonStandings, tolerances: Iterable[int] = range(0, 3)
+) -> np.ndarray:
+    """Return the similarity rates between the leaderboards of every pair of
+    rounds of a season.
+
+    The output has shape rounds x rounds x tolerances: the element [i, j, k]
+    compares the leaderboard after standings.rounds[j] with the reference one
+    after standings.rounds[i], with the k-th tolerance. Rows and columns can
+    be swapped, since the rates are symmetric."""
+    ranks = standings.ranks.T
+    n_rounds = len(ranks)
+    rates = similarity_rates(
+        np.tile(ranks, (n_rounds, 1)), np.repeat(ranks, n_rounds, axis=0), tolerances
+    )
+    return rates.reshape(n_rounds, n_rounds, -1)
+
+
+def lagged_similarity(matrix: np.ndarray, lag: int) -> np.ndarray:
+    """Return the rates of each round compared with the one lag rounds later,
+    as an array of shape (rounds - lag) x tolerances, from the output of
+    round_similarity_matrix"""
+    return np.diagonal(matrix, offset=lag, axis1=0, axis2=1).T
+
+
+def similarity_to_reference(
+    standings: SeasonStandings,
+    reference: SeasonStandings,
+    reference_round: Optional[int] = None,
+    tolerances: Iterable[int] = range(0, 3),
+) -> np.ndarray:
+    """Return the similarity rates of the leaderboards of every round of a
+    season with a reference leaderboard from another season, by default the
+    final one, as an array of shape rounds x tolerances.
+
+    Only the teams taking part in both seasons are compared, each with the
+    rank it has in its own leaderboard, of all the teams of its season."""
+    if reference_round is None:
+        reference_round = reference.last_round
+    _, positions, reference_positions = np.intersect1d(
+        standings.teams, reference.teams, return_indices=True
+    )
+    reference_ranks = reference.ranks_at_round(reference_round)[reference_positions]
+    return similarity_rates(standings.ranks[positions].T, reference_ranks, tolerances)
 
 
 def leaderboard_similarity_rate(
@@ -37,18 +295,14 @@ def leaderboard_similarity_rate(
     difference in ranks is less than or equal the tolerance. The similarity rate
     is the number of teams having a similar rank over the total number of teams
     considered."""
-    is_similar_list = []
-
-    for team in leaderboard1.teams_list:
-        rank_initial = leaderboard1.get_rank_from_team(team)
-        rank_final = leaderboard2.get_rank_from_team(team)
-
-        is_similar_list.append(are_ranks_similar(rank_initial, rank_final, tolerance))
-
-    return mean(is_similar_list)
+    ranks_initial = leaderboard1.ranks
+    ranks_final = leaderboard2.ranks_of_ids(leaderboard1.team_ids)
+    return float(np.mean(are_ranks_similar(ranks_initial, ranks_final, tolerance)))
 
 
-def are_ranks_similar(rank1: int, rank2: int, tolerance: int) -> bool:
+def are_ranks_similar(
+    rank1: Union[int, np.ndarray], rank2: Union[int, np.ndarray], tolerance: int
+) -> Union[bool, np.ndarray]:
     return abs(rank2 - rank1) <= tolerance
 
 
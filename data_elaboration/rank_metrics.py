@@ -0,0 +1,145 @@
+"""Rank correlation metrics between many leaderboards and a reference one.
+
+Every function takes the ranks of the partial leaderboards as an array of
+shape rounds x teams and the ranks of the reference leaderboard as an array of
+shape teams, like similarity_rates, and returns one value per round.
+"""
+from typing import Callable
+
+import numpy as np
+
+
+def spearman_rho(partial_ranks: np.ndarray, final_ranks: np.ndarray) -> np.ndarray:
+    """Return the Spearman correlation of each partial leaderboard with the
+    reference one. Tied teams get the average of their ranks, as usual for
+    this metric, before the Pearson correlation is computed."""
+    partial_ranks, final_ranks = broadcast_ranks(partial_ranks, final_ranks)
+    x = average_ranks(partial_ranks)
+    y = average_ranks(final_ranks)
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    denominator = np.sqrt((x**2).sum(axis=1) * (y**2).sum(axis=1))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x * y).sum(axis=1) / denominator
+
+
+def kendall_tau_b(partial_ranks: np.ndarray, final_ranks: np.ndarray) -> np.ndarray:
+    """Return the Kendall tau-b of each partial leaderboard with the reference
+    one, NaN when all the teams are tied in one of them.
+
+    The discordant pairs are counted as inversions, in O(n log n) per row with
+    Knight's method: teams are sorted by partial rank, ties broken by final
+    rank, and the inversions of the final ranks are counted with a Fenwick
+    tree shared by all the rows."""
+    partial_ranks, final_ranks = broadcast_ranks(partial_ranks, final_ranks)
+    n_teams = partial_ranks.shape[1]
+
+    order = np.lexsort((final_ranks, partial_ranks), axis=1)
+    discordant = count_inversions(np.take_along_axis(final_ranks, order, axis=1))
+
+    pairs = n_teams * (n_teams - 1) // 2
+    partial_ties = tied_pairs(partial_ranks)
+    final_ties = tied_pairs(final_ranks)
+    joint_ties = tied_pairs(partial_ranks * (n_teams + 1) + final_ranks)
+    difference = pairs - partial_ties - final_ties + joint_ties - 2 * discordant
+    denominator = np.sqrt((pairs - partial_ties) * (pairs - final_ties))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(denominator > 0, difference / denominator, np.nan)
+
+
+def top_k_overlap(
+    partial_ranks: np.ndarray, final_ranks: np.ndarray, k: int = 4
+) -> np.ndarray:
+    """Return the share of the teams ranked in the first k places of the
+    reference leaderboard which are also in the first k places of each partial
+    one"""
+    return zone_overlap(partial_ranks <= k, final_ranks <= k)
+
+
+def relegation_overlap(
+    partial_ranks: np.ndarray, final_ranks: np.ndarray, size: int = 3
+) -> np.ndarray:
+    """Return the share of the teams in the relegation zone of the reference
+    leaderboard, i.e. its last size places, which are also in the relegation
+    zone of each partial one"""
+    n_teams = np.shape(partial_ranks)[-1]
+    return zone_overlap(partial_ranks > n_teams - size, final_ranks > n_teams - size)
+
+
+RANK_METRICS: dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "Spearman rho": spearman_rho,
+    "Kendall tau-b": kendall_tau_b,
+    "Top 4 overlap": top_k_overlap,
+    "Relegation overlap": relegation_overlap,
+}
+
+
+################################################################################
+# Helpers working on all the rows at once
+################################################################################
+def broadcast_ranks(
+    partial_ranks: np.ndarray, final_ranks: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    partial_ranks = np.atleast_2d(partial_ranks).astype(np.int64)
+    final_ranks = np.broadcast_to(final_ranks, partial_ranks.shape).astype(np.int64)
+    return partial_ranks, final_ranks
+
+
+def zone_overlap(partial_zone: np.ndarray, final_zone: np.ndarray) -> np.ndarray:
+    partial_zone, final_zone = np.broadcast_arrays(
+        np.atleast_2d(partial_zone), final_zone
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (partial_zone & final_zone).sum(axis=1) / final_zone.sum(axis=1)
+
+
+def tie_counts(ranks: np.ndarray) -> np.ndarray:
+    """Return, for each element, how many elements of its row share its value"""
+    n_rows = len(ranks)
+    _, codes = np.unique(ranks, return_inverse=True)
+    codes = codes.reshape(ranks.shape)
+    offsets = np.arange(n_rows)[:, np.newaxis] * (codes.max() + 1)
+    counts = np.bincount((codes + offsets).ravel())
+    return counts[codes + offsets]
+
+
+def tied_pairs(ranks: np.ndarray) -> np.ndarray:
+    """Return the number of pairs with equal values in each row"""
+    return ((tie_counts(ranks) - 1).sum(axis=1)) // 2
+
+
+def average_ranks(min_ranks: np.ndarray) -> np.ndarray:
+    """Convert ranks computed with the "min" method to the "average" one"""
+    return min_ranks + (tie_counts(min_ranks) - 1) / 2
+
+
+def count_inversions(values: np.ndarray) -> np.ndarray:
+    """Return the number of pairs i < j with values[i] > values[j] in each row.
+
+    values must be positive integers. A Fenwick tree per row counts how many
+    of the previous values are not greater than the current one; the loops run
+    over the columns and the bits of the values, each step covering all the
+    rows."""
+    n_rows, n_columns = values.shape
+    size = int(values.max())
+    tree = np.zeros((n_rows, size + 1), dtype=np.int64)
+    rows = np.arange(n_rows)
+    inversions = np.zeros(n_rows, dtype=np.int64)
+
+    for column in range(n_columns):
+        value = values[:, column]
+
+        not_greater = np.zeros(n_rows, dtype=np.int64)
+        index = value.copy()
+        while index.any():
+            not_greater += tree[rows, index]
+            index -= index & -index
+        inversions += column - not_greater
+
+        index = value.copy()
+        while (index <= size).any():
+            in_tree = index <= size
+            tree[rows[in_tree], index[in_tree]] += 1
+            index += index & -index
+
+    return inversions
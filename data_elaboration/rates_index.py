@@ -0,0 +1,140 @@
+"""Similarity rates laid out in a dense array, indexed once for fast queries."""
+import warnings
+from dataclasses import dataclass, field
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.instrumentation import METRICS
+
+
+@dataclass
+class RatesIndex:
+    """Similarity rates of many leagues, keyed by (league, tolerance, round,
+    season).
+
+    rates is a leagues x tolerances x rounds x seasons array, with NaN where a
+    combination is missing, e.g. rounds past the end of shorter seasons.
+    Every query is a lookup of the positions of its keys followed by a slice
+    or a reduction of the array, so its cost does not depend on the number of
+    rows of the rates frame the index was built from.
+    """
+
+    leagues: list[str]
+    tolerances: np.ndarray
+    rounds: np.ndarray
+    seasons: np.ndarray
+    rates: np.ndarray
+    positions: dict[str, dict] = field(init=False, repr=False)
+    median_rates: np.ndarray = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.positions = {
+            name: {key: position for position, key in enumerate(keys)}
+            for name, keys in [
+                ("league", self.leagues),
+                ("tolerance", self.tolerances.tolist()),
+                ("round", self.rounds.tolist()),
+                ("season", self.seasons.tolist()),
+            ]
+        }
+        # Medians are the most requested statistic: compute them all at once
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            self.median_rates = np.nanmedian(self.rates, axis=3)
+
+    def rounds_table(self, league: str, tolerance: int) -> np.ndarray:
+        """Return the rounds x seasons array of the rates of a league"""
+        return self.rates[
+            self.positions["league"][league],
+            self.positions["tolerance"][tolerance],
+        ]
+
+    def league_rounds(self, league: str) -> list[int]:
+        """Return the rounds having at least a rate for the league"""
+        has_rates = ~np.isnan(self.rates[self.positions["league"][league]])
+        return self.rounds[has_rates.any(axis=(0, 2))].tolist()
+
+    def round_distribution(
+        self, league: str, tolerance: int, round_: int
+    ) -> np.ndarray:
+        """Return the rates of a round across all the seasons"""
+        rates = self.rounds_table(league, tolerance)[self.positions["round"][round_]]
+        return rates[~np.isnan(rates)]
+
+    def round_distributions(
+        self, league: str, tolerance: int, rounds: list[int]
+    ) -> list[np.ndarray]:
+        """Return the rates across all the seasons for each of the rounds"""
+        return [self.round_distribution(league, tolerance, round_) for round_ in rounds]
+
+    def medians(self, league: str, tolerance: int, rounds: list[int]) -> np.ndarray:
+        """Return the median rate across all the seasons for each of the rounds"""
+        medians = self.median_rates[
+            self.positions["league"][league], self.positions["tolerance"][tolerance]
+        ]
+        positions = self.round_positions(rounds)
+        return np.where(positions >= 0, medians[positions], np.nan)
+
+    def quantiles(
+        self, league: str, tolerance: int, rounds: list[int], q: float
+    ) -> np.ndarray:
+        """Return the q-th quantile of the rates across all the seasons for each
+        of the rounds, NaN for the rounds without rates"""
+        positions = self.round_positions(rounds)
+        table = self.rounds_table(league, tolerance)[positions]
+        table[positions < 0] = np.nan
+        with warnings.catch_warnings():
+            # Rounds without any rate give NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            return np.nanquantile(table, q, axis=1)
+
+    def round_positions(self, rounds: list[int]) -> np.ndarray:
+        """Return the positions of the rounds in the array, -1 if missing"""
+        return np.array(
+            [self.positions["round"].get(round_, -1) for round_ in rounds], int
+        )
+
+    def season_series(
+        self, league: str, tolerance: int, round_: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the seasons and the rates of a round across the seasons"""
+        rates = self.rounds_table(league, tolerance)[self.positions["round"][round_]]
+        has_rate = ~np.isnan(rates)
+        return self.seasons[has_rate], rates[has_rate]
+
+
+@METRICS.timed("stage rates index")
+def rates_index(rates: Union[pd.DataFrame, dict[str, pd.DataFrame]]) -> RatesIndex:
+    """Build the index of a rates data frame, as returned by
+    rate_df_from_results, or of a dictionary of them keyed by league label.
+
+    A single frame is split in leagues by its "Serie" column. Only the
+    similarity rates are indexed, not the other metrics."""
+    if isinstance(rates, dict):
+        leagues = np.repeat(list(rates), [len(df) for df in rates.values()])
+        rates = pd.concat(rates.values(), ignore_index=True)
+    else:
+        leagues = rates["Serie"].to_numpy()
+    if "Metric" in rates.columns:
+        is_similarity_rate = (rates["Metric"] == "Similarity rate").to_numpy()
+        rates = rates.loc[is_similarity_rate, :]
+        leagues = leagues[is_similarity_rate]
+
+    league_codes, league_labels = pd.factorize(leagues)
+    tolerance_codes, tolerances = pd.factorize(rates["Tolerance"], sort=True)
+    round_codes, rounds = pd.factorize(rates["Round"], sort=True)
+    season_codes, seasons = pd.factorize(rates["Season"], sort=True)
+
+    array = np.full(
+        (len(league_labels), len(tolerances), len(rounds), len(seasons)), np.nan
+    )
+    array[league_codes, tolerance_codes, round_codes, season_codes] = rates["Rate"]
+    return RatesIndex(
+        list(league_labels),
+        np.asarray(tolerances, dtype=np.int64),
+        np.asarray(rounds, dtype=np.int64),
+        np.asarray(seasons, dtype=np.int64),
+        array,
+    )
@@ -1,37 +1,81 @@
 """Functions to convert a dataframe of matches into a dataframe of results."""
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 
+from data_download.constants import VOID_SCORES
+from data_elaboration.teams import TEAMS
+from data_pipeline.instrumentation import METRICS
 
+# Indexed by the sign of the goal difference: draw, win, loss
+RESULT_SIGNS = np.array(["X", "1", "2"])
+POINTS_PER_SIGN = np.array([1, 3, 0], dtype=np.int8)
+
+
+@METRICS.timed("stage results")
 def results_df_from_matches(df: pd.DataFrame) -> pd.DataFrame:
     """Intakes a dataframe of matches and outputs a dataframe of results."""
     df = add_result_column(df)
     df = add_points_per_team_columns(df)
+    return long_results(df, df["Points team 1"], df["Points team 2"])
 
-    df1 = df.loc[:, ["Team 1", "Season", "Round", "Points team 1"]].copy()
-    df2 = df.loc[:, ["Team 2", "Season", "Round", "Points team 2"]].copy()
 
-    df1.columns = ["Team", "Season", "Round", "Points earned"]
-    df2.columns = ["Team", "Season", "Round", "Points earned"]
+def results_df_from_scores(df: pd.DataFrame) -> pd.DataFrame:
+    """Intakes a dataframe of matches with the scores as raw strings, like
+    '3:4 (0:3) ', and outputs a dataframe of results.
 
-    df1 = df1.append(df2)
-    return df1
+    The goals are extracted from the "Score" column, the other columns needed
+    are "Team 1", "Team 2", "Season" and "Round"."""
+    goals = goals_from_scores(df["Score"])
+    sign = np.sign(goals[:, 0] - goals[:, 1])
+    return long_results(df, POINTS_PER_SIGN[sign], POINTS_PER_SIGN[-sign])
 
 
-def add_result_column(df: pd.DataFrame) -> pd.DataFrame:
-    score_difference = df["Score Team 1"] - df["Score Team 2"]
-    df["Result"] = score_difference.apply(score_diff_to_result_sign)
-    return df
+def goals_from_scores(scores: pd.Series) -> np.ndarray:
+    """Return an array with the goals of the two teams in two columns.
+
+    There are only few distinct scores, so they are parsed once each and
+    then spread over the matches. Aborted and not played matches, " abor."
+    and " dnp" on the pages, count as 0:0 like in the original parser."""
+    codes, unique_scores = pd.factorize(scores)
+    unique_scores = pd.Series(unique_scores)
+    goals = unique_scores.str.extract(r"^(\d+):(\d+)")
+    goals[unique_scores.isin(list(VOID_SCORES))] = "0"
+    return goals.astype(np.int64).to_numpy()[codes]
 
 
-def score_diff_to_result_sign(score_diff: int) -> str:
-    if score_diff > 0:
-        return "1"
-    if score_diff < 0:
-        return "2"
-    return "X"
+def long_results(
+    df: pd.DataFrame, points_team1: np.ndarray, points_team2: np.ndarray
+) -> pd.DataFrame:
+    """Stack the two teams of each match in a data frame of results with
+    columns ["Team", "Season", "Round", "Points earned"]"""
+    teams = union_categoricals(TEAMS.categoricals(df["Team 1"], df["Team 2"]))
+    return pd.DataFrame(
+        {
+            "Team": teams,
+            "Season": np.tile(df["Season"].to_numpy(), 2),
+            "Round": np.tile(df["Round"].to_numpy(), 2),
+            "Points earned": np.concatenate(
+                [np.asarray(points_team1), np.asarray(points_team2)]
+            ).astype(np.int8),
+        }
+    )
+
+
+def add_result_column(df: pd.DataFrame) -> pd.DataFrame:
+    df["Result"] = RESULT_SIGNS[score_difference_sign(df)]
+    return df
 
 
 def add_points_per_team_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df["Points team 1"] = df["Result"].map({"1": 3, "2": 0, "X": 1})
-    df["Points team 2"] = df["Result"].map({"1": 0, "2": 3, "X": 1})
+    sign = score_difference_sign(df)
+    df["Points team 1"] = POINTS_PER_SIGN[sign]
+    df["Points team 2"] = POINTS_PER_SIGN[-sign]
     return df
+
+
+def score_difference_sign(df: pd.DataFrame) -> np.ndarray:
+    """Return 1 where team 1 won, -1 where team 2 won and 0 for draws"""
+    goals_team1 = df["Score Team 1"].to_numpy(dtype=np.int64)
+    goals_team2 = df["Score Team 2"].to_numpy(dtype=np.int64)
+    return np.sign(goals_team1 - goals_team2)
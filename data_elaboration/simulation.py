@@ -0,0 +1,223 @@
+"""Monte Carlo simulation of the rest of a season from its partial standings."""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_elaboration.leaderboard_comparison import similarity_rates
+from data_elaboration.results import POINTS_PER_SIGN, results_df_from_matches
+from data_elaboration.standings import min_ranks, season_standings
+from data_pipeline.instrumentation import METRICS
+
+# Weight, in matches, of the league averages in the strength of each team
+PRIOR_MATCHES = 5
+BATCH_SIZE = 10_000
+
+
+@dataclass
+class SeasonSimulation:
+    """Distribution of the final ranks of a season simulated from a round.
+
+    Parameters
+    ----------
+    season : int
+        Starting year of the season.
+    round : int
+        Last round whose results are known.
+    teams : np.ndarray
+        Teams of the season, in the order of the rows of rank_probabilities.
+    rank_probabilities : np.ndarray
+        Array of shape teams x teams: the element [i, j] is the probability
+        that teams[i] ends the season with rank j + 1. Ranks follow the "min"
+        method, so the columns of tied ranks may not add up to one.
+    tolerances : np.ndarray
+        Tolerances of the expected similarity rates.
+    expected_similarity : np.ndarray
+        Expected similarity rate between the leaderboard at the given round and
+        the final one, for each tolerance.
+    simulations : int
+        Number of simulated seasons.
+    """
+
+    season: int
+    round: int
+    teams: np.ndarray
+    rank_probabilities: np.ndarray
+    tolerances: np.ndarray
+    expected_similarity: np.ndarray
+    simulations: int
+
+    @property
+    def expected_ranks(self) -> np.ndarray:
+        """Return the expected final rank of each team"""
+        ranks = np.arange(1, len(self.teams) + 1)
+        return self.rank_probabilities @ ranks
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Return the rank probabilities with a row per team and a column per
+        rank, sorted by expected rank"""
+        df = pd.DataFrame(
+            self.rank_probabilities,
+            index=pd.Index(self.teams, name="Team"),
+            columns=np.arange(1, len(self.teams) + 1),
+        )
+        df["Expected rank"] = self.expected_ranks
+        return df.sort_values(by="Expected rank")
+
+
+@dataclass(frozen=True)
+class SimulationSetup:
+    """Everything a batch of simulations needs, cheap to send to workers.
+
+    current_points holds the points of each team at the simulated round,
+    current_ranks their ranks, home and away the team indexes of the
+    remaining fixtures and outcome_thresholds their cumulative probabilities
+    of home win and draw, as an array of shape fixtures x 2."""
+
+    current_points: np.ndarray
+    current_ranks: np.ndarray
+    home: np.ndarray
+    away: np.ndarray
+    outcome_thresholds: np.ndarray
+    tolerances: np.ndarray
+
+
+@METRICS.timed("stage simulation")
+def simulate_season(
+    df_matches: pd.DataFrame,
+    season: int,
+    round_: int,
+    simulations: int = 100_000,
+    seed: Optional[int] = None,
+    workers: Optional[int] = 0,
+    tolerances: Iterable[int] = range(0, 3),
+) -> SeasonSimulation:
+    """Simulate the rest of a season from the standings after a given round.
+
+    The strength of each team is given by its rates of wins, draws and losses
+    up to the round, shrunk towards the league averages. The remaining
+    fixtures are the ordered pairs of teams not played yet, as in a double
+    round robin, and each of them is won by a team with the average of its
+    win rate and of the loss rate of the opponent.
+
+    Simulations run in batches, each with its own random stream spawned from
+    seed, so that the output only depends on the seed. With workers > 0 the
+    batches are split among that many processes, with None among one process
+    per CPU.
+    """
+    setup, teams = simulation_setup(df_matches, season, round_, tolerances)
+    batches = [BATCH_SIZE] * (simulations // BATCH_SIZE)
+    if simulations % BATCH_SIZE:
+        batches.append(simulations % BATCH_SIZE)
+    streams = np.random.SeedSequence(seed).spawn(len(batches))
+
+    if workers == 0:
+        outputs = list(map(simulate_batch, [setup] * len(batches), batches, streams))
+    else:
+        max_workers = os.cpu_count() if workers is None else workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            outputs = list(
+                executor.map(simulate_batch, [setup] * len(batches), batches, streams)
+            )
+
+    rank_counts = sum(counts for counts, _ in outputs)
+    similarity_sums = sum(sums for _, sums in outputs)
+    return SeasonSimulation(
+        season=season,
+        round=round_,
+        teams=teams,
+        rank_probabilities=rank_counts / simulations,
+        tolerances=setup.tolerances,
+        expected_similarity=similarity_sums / simulations,
+        simulations=simulations,
+    )
+
+
+def simulation_setup(
+    df_matches: pd.DataFrame, season: int, round_: int, tolerances: Iterable[int]
+) -> tuple[SimulationSetup, np.ndarray]:
+    """Prepare the simulation of a season after a round, returning also the
+    teams in the order used by the setup"""
+    df_matches = df_matches.loc[df_matches["Season"] == season, :]
+    played = df_matches.loc[df_matches["Round"] <= round_, :].copy()
+    df_results = results_df_from_matches(played)
+    standings = season_standings(df_results)[season]
+    teams = standings.teams
+
+    # Outcome rates per team: wins, draws and losses
+    outcomes = np.zeros((len(teams), 3))
+    team_codes = pd.Index(teams).get_indexer(df_results["Team"])
+    outcome_codes = outcome_of_points(df_results["Points earned"].to_numpy())
+    np.add.at(outcomes, (team_codes, outcome_codes), 1)
+    league_rates = outcomes.sum(axis=0) / outcomes.sum()
+    rates = (outcomes + PRIOR_MATCHES * league_rates) / (
+        outcomes.sum(axis=1, keepdims=True) + PRIOR_MATCHES
+    )
+
+    # Remaining fixtures: all the ordered pairs of teams minus the played ones
+    team_index = {team: index for index, team in enumerate(teams)}
+    is_played = np.eye(len(teams), dtype=bool)
+    is_played[
+        played["Team 1"].map(team_index).to_numpy(dtype=np.int64),
+        played["Team 2"].map(team_index).to_numpy(dtype=np.int64),
+    ] = True
+    home, away = np.nonzero(~is_played)
+
+    home_win = (rates[home, 0] + rates[away, 2]) / 2
+    draw = (rates[home, 1] + rates[away, 1]) / 2
+    setup = SimulationSetup(
+        current_points=standings.points_at_round(round_),
+        current_ranks=standings.ranks_at_round(round_),
+        home=home,
+        away=away,
+        outcome_thresholds=np.column_stack([home_win, home_win + draw]),
+        tolerances=np.asarray(tolerances),
+    )
+    return setup, teams
+
+
+def outcome_of_points(points: np.ndarray) -> np.ndarray:
+    """Return 0 for wins, 1 for draws and 2 for losses"""
+    return np.select(
+        [points == POINTS_PER_SIGN[1], points == POINTS_PER_SIGN[0]], [0, 1], 2
+    )
+
+
+def simulate_batch(
+    setup: SimulationSetup, simulations: int, stream: np.random.SeedSequence
+) -> tuple[np.ndarray, np.ndarray]:
+    """Simulate a batch of seasons, returning the counts of each final rank
+    per team and the sum of the similarity rates per tolerance"""
+    rng = np.random.default_rng(stream)
+    n_teams = len(setup.current_points)
+    n_fixtures = len(setup.home)
+
+    uniforms = rng.random((simulations, n_fixtures))
+    home_wins = uniforms < setup.outcome_thresholds[:, 0]
+    is_draw = ~home_wins & (uniforms < setup.outcome_thresholds[:, 1])
+    outcomes = np.where(home_wins, 1, np.where(is_draw, 0, -1))
+    home_points = POINTS_PER_SIGN[outcomes]
+    away_points = POINTS_PER_SIGN[-outcomes]
+
+    # Fixtures x teams incidence matrices turn the points of the matches into
+    # the points of the teams with two products
+    home_incidence = np.zeros((n_fixtures, n_teams), dtype=np.float32)
+    home_incidence[np.arange(n_fixtures), setup.home] = 1
+    away_incidence = np.zeros((n_fixtures, n_teams), dtype=np.float32)
+    away_incidence[np.arange(n_fixtures), setup.away] = 1
+    final_points = (
+        home_points.astype(np.float32) @ home_incidence
+        + away_points.astype(np.float32) @ away_incidence
+        + setup.current_points
+    )
+
+    final_ranks = min_ranks(final_points.T).T
+    offsets = np.arange(n_teams) * n_teams
+    rank_counts = np.bincount(
+        (final_ranks - 1 + offsets).ravel(), minlength=n_teams * n_teams
+    ).reshape(n_teams, n_teams)
+    rates = similarity_rates(final_ranks, setup.current_ranks, setup.tolerances)
+    return rank_counts, rates.sum(axis=0)
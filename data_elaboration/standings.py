@@ -0,0 +1,149 @@
+"""Cumulative standings of every team at every round, computed once per season."""
+from dataclasses import dataclass
+from typing import Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from data_elaboration.teams import TEAMS
+
+# Inclusive range of ranks, None for an open side
+RanksRange = tuple[Optional[int], Optional[int]]
+
+
+@dataclass
+class SeasonStandings:
+    """Points and ranks of all the teams of a season across all its rounds.
+
+    Arrays are laid out as teams x rounds: the row i refers to teams[i], whose
+    ID in the team registry is team_ids[i], the column j to rounds[j]. Ranks
+    follow the "min" method, i.e. teams level on points share the best of
+    their ranks.
+    """
+
+    season: int
+    teams: np.ndarray
+    rounds: np.ndarray
+    points: np.ndarray
+    cumulative_points: np.ndarray
+    ranks: np.ndarray
+    team_ids: np.ndarray
+
+    @property
+    def last_round(self) -> int:
+        """Return the last round played in the season"""
+        return int(self.rounds[-1])
+
+    def round_position(self, round_: int) -> int:
+        """Return the column index of the standings for a given round"""
+        position = int(np.searchsorted(self.rounds, round_, side="right")) - 1
+        if position < 0:
+            raise KeyError(f"No round <= {round_} in season {self.season}")
+        return position
+
+    def round_positions(self, rounds: Iterable[int]) -> np.ndarray:
+        """Return the column indexes of the standings for many rounds at once"""
+        positions = np.searchsorted(self.rounds, np.asarray(rounds), side="right") - 1
+        if (positions < 0).any():
+            raise KeyError(f"Rounds before the first one of season {self.season}")
+        return positions
+
+    def points_at_round(self, round_: int) -> np.ndarray:
+        """Return the cumulative points of each team after a given round"""
+        return self.cumulative_points[:, self.round_position(round_)]
+
+    def ranks_at_round(self, round_: int) -> np.ndarray:
+        """Return the rank of each team after a given round"""
+        return self.ranks[:, self.round_position(round_)]
+
+    def rank_mask(self, ranks_range: RanksRange) -> np.ndarray:
+        """Return a teams x rounds boolean array, true where the team is in
+        the range of ranks after the round. See rank_range_mask."""
+        return rank_range_mask(self.ranks, ranks_range, len(self.teams))
+
+    def teams_in_ranks(self, round_: int, ranks_range: RanksRange) -> np.ndarray:
+        """Return the teams in the range of ranks after a given round, e.g.
+        the top 4 with (None, 4) or the last 3 with (-3, None)"""
+        ranks = self.ranks_at_round(round_)
+        return self.teams[rank_range_mask(ranks, ranks_range, len(self.teams))]
+
+
+def rank_range_mask(
+    ranks: np.ndarray, ranks_range: RanksRange, n_teams: Union[int, np.ndarray]
+) -> np.ndarray:
+    """Return true where the ranks are in the range, inclusive on both sides.
+
+    Either bound can be None for a one-sided range. Negative bounds count
+    from the bottom of a leaderboard of n_teams teams, like negative indexes:
+    -1 is the last rank, so (-3, None) is the relegation zone of the usual
+    three teams. n_teams can be an array broadcasting against ranks, for
+    leaderboards of different sizes. Ranks start at 1, so a bound of 0 raises
+    a ValueError.
+    """
+    min_rank, max_rank = ranks_range
+    if 0 in (min_rank, max_rank):
+        raise ValueError(f"Rank bounds start at 1, got {ranks_range}")
+    mask = np.ones(np.shape(ranks), dtype=bool)
+    if min_rank is not None:
+        mask &= ranks >= (min_rank if min_rank > 0 else n_teams + 1 + min_rank)
+    if max_rank is not None:
+        mask &= ranks <= (max_rank if max_rank > 0 else n_teams + 1 + max_rank)
+    return mask
+
+
+def season_standings(results: pd.DataFrame) -> dict[int, SeasonStandings]:
+    """Return the standings of all the seasons found in a results data frame.
+
+    The results are pivoted once into a (season, team) x round matrix of points,
+    which is then split by season and accumulated along the rounds.
+    """
+    points = results.pivot_table(
+        index=["Season", "Team"],
+        columns="Round",
+        values="Points earned",
+        aggfunc="sum",
+        fill_value=0,
+        observed=True,
+    )
+    rounds_per_season = results.groupby("Season")["Round"].max()
+
+    output = {}
+    for season, season_points in points.groupby(level="Season", sort=True):
+        last_round = rounds_per_season[season]
+        season_points = season_points.loc[:, season_points.columns <= last_round]
+        output[int(season)] = standings_from_points_matrix(
+            int(season),
+            season_points.index.get_level_values("Team").to_numpy(),
+            season_points.columns.to_numpy(),
+            season_points.to_numpy(),
+        )
+    return output
+
+
+def standings_from_points_matrix(
+    season: int, teams: np.ndarray, rounds: np.ndarray, points: np.ndarray
+) -> SeasonStandings:
+    """Build the standings from a teams x rounds matrix of points earned"""
+    cumulative_points = points.cumsum(axis=1)
+    return SeasonStandings(
+        season=season,
+        teams=teams,
+        rounds=rounds,
+        points=points,
+        cumulative_points=cumulative_points,
+        ranks=min_ranks(cumulative_points),
+        team_ids=TEAMS.intern(teams),
+    )
+
+
+def min_ranks(cumulative_points: np.ndarray) -> np.ndarray:
+    """Rank the teams by points for every round with the "min" method.
+
+    The rank of a team is one plus the number of teams with strictly more
+    points at the same round, which matches pandas rank(method="min",
+    ascending=False) applied column by column.
+    """
+    better_teams = (
+        cumulative_points[np.newaxis, :, :] > cumulative_points[:, np.newaxis, :]
+    )
+    return better_teams.sum(axis=1) + 1
@@ -0,0 +1,69 @@
+"""Interning of team names into small integer IDs shared by the whole pipeline."""
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+TEAM_ID_DTYPE = np.int16
+
+
+class TeamRegistry:
+    """Assign to every team name a stable integer ID, in order of appearance.
+
+    IDs are only ever added, so they stay valid for the whole life of the
+    process, but not across processes: every process registers the names in
+    the order it meets them. Team columns built with categorical have the
+    names registered so far as categories, so that their codes are the team
+    IDs; build related columns together with categoricals, so that they share
+    the same categories and can be concatenated without losing their dtype.
+    """
+
+    __slots__ = ("names", "ids")
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.ids: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def intern(self, names: Iterable[str]) -> np.ndarray:
+        """Return the IDs of the names, registering the new ones"""
+        if isinstance(names, pd.Series):
+            names = names.array
+        if isinstance(names, pd.Categorical):
+            # Only the categories need to be looked up
+            codes, unique_names = names.codes, names.categories
+        else:
+            codes, unique_names = pd.factorize(np.asarray(names, dtype=object))
+        unique_ids = np.array(
+            [self.id_of(name) for name in unique_names], dtype=TEAM_ID_DTYPE
+        )
+        return unique_ids[codes]
+
+    def id_of(self, name: str) -> int:
+        """Return the ID of a single name, registering it if new"""
+        team_id = self.ids.get(name)
+        if team_id is None:
+            team_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+        return team_id
+
+    def names_of(self, ids: np.ndarray) -> np.ndarray:
+        """Return the names of the given IDs"""
+        return np.asarray(self.names, dtype=object)[ids]
+
+    def categorical(self, names: Iterable[str]) -> pd.Categorical:
+        """Return the names as a categorical whose codes are the team IDs"""
+        return self.categoricals(names)[0]
+
+    def categoricals(self, *columns: Iterable[str]) -> list[pd.Categorical]:
+        """Return every column of names as a categorical whose codes are the
+        team IDs, all with the same categories"""
+        ids = [self.intern(names) for names in columns]
+        dtype = pd.CategoricalDtype(self.names)
+        return [pd.Categorical.from_codes(codes, dtype=dtype) for codes in ids]
+
+
+# Registry used across the pipeline, from parsing to leaderboards
+TEAMS = TeamRegistry()
@@ -0,0 +1,214 @@
+"""Lightweight timers, counters and latency histograms across the pipeline.
+
+Hooks record into the global METRICS, which is disabled by default: each hook
+then returns right away, so that they can stay in the hot paths. Metrics are
+kept by the process recording them, so work done in worker processes reports
+its timings back to the parent, as the page parses and the tasks do.
+"""
+
+import bisect
+import cProfile
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Iterator, Optional
+
+# Upper bounds of the buckets of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30)
+TOP_ALLOCATIONS = 10
+
+
+class Histogram:
+    """Counts of latencies in the LATENCY_BUCKETS, with their sum and extremes"""
+
+    __slots__ = ("counts", "total", "minimum", "maximum")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.minimum = float("inf")
+        self.maximum = 0.0
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def add(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding the quantile q"""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def to_dict(self) -> dict:
+        buckets = {f"<={bound}": n for bound, n in zip(LATENCY_BUCKETS, self.counts)}
+        buckets[f">{LATENCY_BUCKETS[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.minimum if self.count else None,
+            "max": self.maximum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": buckets,
+        }
+
+
+class Timer:
+    """Context manager adding the time spent in its block to a histogram"""
+
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str) -> None:
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self) -> "Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception) -> None:
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Counters and latency histograms keyed by name, safe to share among
+    threads. Nothing is recorded until enable is called."""
+
+    __slots__ = ("enabled", "counters", "histograms", "lock")
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.counters: dict[str, float] = {}
+        self.histograms: dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Add value to the counter with the given name"""
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Add a latency to the histogram with the given name"""
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def timer(self, name: str):
+        """Return a context manager timing its block into a histogram"""
+        if not self.enabled:
+            return nullcontext()
+        return Timer(self, name)
+
+    def timed(self, name: Optional[str] = None) -> Callable:
+        """Decorator timing every call of a function into a histogram named
+        after the function, unless a name is given"""
+
+        def decorator(function: Callable) -> Callable:
+            label = name or function.__qualname__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Timer(self, label):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {
+                    name: histogram.to_dict()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def instrumented(
+    metrics_path: Optional[str] = None,
+    profile_path: Optional[str] = None,
+    trace_memory: bool = False,
+) -> Iterator[Metrics]:
+    """Record the metrics of the block and save them as JSON in metrics_path.
+
+    With profile_path, the block also runs under cProfile and its statistics
+    are saved there, to be read with pstats. With trace_memory, the peak
+    memory traced by tracemalloc and the lines allocating the most are added
+    to the metrics.
+    """
+    METRICS.reset()
+    METRICS.enable()
+    profiler = cProfile.Profile() if profile_path else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield METRICS
+    finally:
+        elapsed = time.perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+        output = {"seconds": elapsed, **METRICS.to_dict()}
+        if trace_memory:
+            output["memory"] = memory_report()
+            tracemalloc.stop()
+        METRICS.disable()
+        if metrics_path:
+            with open(metrics_path, "w", encoding="utf-8") as file:
+                json.dump(output, file, indent=2)
+
+
+def memory_report() -> dict:
+    """Return the peak memory traced so far and the lines allocating most of
+    the memory still in use"""
+    _, peak = tracemalloc.get_traced_memory()
+    statistics = tracemalloc.take_snapshot().statistics("lineno")
+    return {
+        "peak_bytes": peak,
+        "top_allocations": [
+            {"location": str(statistic.traceback), "bytes": statistic.size}
+            for statistic in statistics[:TOP_ALLOCATIONS]
+        ],
+    }
@@ -0,0 +1,271 @@
+"""Run the analysis of many leagues and seasons as a graph of parallel tasks.
+
+Each (league, season) goes through the stages fetch -> parse -> results ->
+rates -> persist, then the plots of a league wait for all its seasons and the
+plots across leagues wait for all the leagues. Every task writes its output
+in the work folder, so that tasks completed in a previous run are skipped.
+"""
+
+import json
+import os
+from datetime import date
+from typing import Optional
+
+import pandas as pd
+
+from data_download.leagues import LEAGUES
+from data_download.page_cache import PageCache, write_atomically
+from data_download.scheduler import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_REQUESTS_PER_SECOND,
+    DownloadScheduler,
+)
+from data_download.worldfootball import (
+    MatchesColumns,
+    discover_season_rounds,
+    parse_pages_as_they_arrive,
+    season_closing_date,
+    season_round_pages,
+)
+from data_elaboration.bootstrap import bootstrap_median_bands
+from data_elaboration.leaderboard_comparison import rate_df_from_results
+from data_elaboration.rates_index import rates_index
+from data_elaboration.results import results_df_from_matches
+from data_pipeline.task_graph import Task, TaskGraph
+from data_storage.store import DataStore, rates_from_store
+
+STAGES = ["fetch", "parse", "results", "rates", "persist", "plot"]
+
+
+def run_analysis(
+    league_labels: list[str],
+    start_season: int,
+    end_season: int,
+    stage_workers: Optional[dict[str, int]] = None,
+    work_dir: str = "saved_dataframes/pipeline",
+    store_root: str = "saved_dataframes/store",
+    force: bool = False,
+) -> list[str]:
+    """Run the whole analysis and return the names of the tasks run.
+
+    stage_workers sets the number of processes of each stage, by default one
+    for the "fetch" stage and one per CPU for the others. The fetch processes
+    share the concurrency and rate limits of a single DownloadScheduler, so
+    that more of them do not send more requests to worldfootball.net.
+    """
+    stage_workers = {"fetch": 1, **(stage_workers or {})}
+    fetch_workers = stage_workers["fetch"] or os.cpu_count()
+    tasks = analysis_tasks(
+        league_labels, start_season, end_season, work_dir, store_root, fetch_workers
+    )
+    return TaskGraph(tasks).run(stage_workers, force)
+
+
+def analysis_tasks(
+    league_labels: list[str],
+    start_season: int,
+    end_season: int,
+    work_dir: str,
+    store_root: str,
+    fetch_workers: int = 1,
+) -> list[Task]:
+    tasks = []
+    all_persisted = []
+    for league in league_labels:
+        league_persisted = []
+        for season in range(start_season, end_season + 1):
+            paths = {
+                stage: os.path.join(work_dir, stage, league, f"{season}.{extension}")
+                for stage, extension in [
+                    ("fetch", "json"),
+                    ("parse", "pkl"),
+                    ("results", "pkl"),
+                    ("rates", "pkl"),
+                    ("persist", "done"),
+                ]
+            }
+
+            key = f"{league}/{season}"
+            tasks += [
+                Task(
+                    f"fetch/{key}",
+                    "fetch",
+                    fetch_season,
+                    (league, season, paths["fetch"], fetch_workers),
+                    output=paths["fetch"],
+                    rerun=may_have_changed(paths["fetch"], season),
+                ),
+                Task(
+                    f"parse/{key}",
+                    "parse",
+                    parse_season,
+                    (league, season, paths["fetch"], paths["parse"]),
+                    (f"fetch/{key}",),
+                    paths["parse"],
+                ),
+                Task(
+                    f"results/{key}",
+                    "results",
+                    season_results,
+                    (paths["parse"], paths["results"]),
+                    (f"parse/{key}",),
+                    paths["results"],
+                ),
+                Task(
+                    f"rates/{key}",
+                    "rates",
+                    season_rates,
+                    (league, season, paths["results"], paths["rates"]),
+                    (f"results/{key}",),
+                    paths["rates"],
+                ),
+                Task(
+                    f"persist/{key}",
+                    "persist",
+                    persist_season,
+                    (league, store_root, paths, paths["persist"]),
+                    (f"rates/{key}",),
+                    paths["persist"],
+                ),
+            ]
+            league_persisted.append(f"persist/{key}")
+
+        plot_output = os.path.join(work_dir, "plot", f"{league}.done")
+        tasks.append(
+            Task(
+                f"plot/{league}",
+                "plot",
+                plot_league,
+                (league, start_season, end_season, store_root, plot_output),
+                tuple(league_persisted),
+                plot_output,
+            )
+        )
+        all_persisted += league_persisted
+
+    across_leagues_output = os.path.join(work_dir, "plot", "across leagues.done")
+    tasks.append(
+        Task(
+            "plot/across leagues",
+            "plot",
+            plot_across_leagues,
+            (
+                league_labels,
+                start_season,
+                end_season,
+                store_root,
+                across_leagues_output,
+            ),
+            tuple(all_persisted),
+            across_leagues_output,
+        )
+    )
+    return tasks
+
+
+def may_have_changed(fetch_output: str, season: int) -> bool:
+    """Return true if the pages of a season may have changed since they were
+    fetched: the season is in progress, or it was when they were fetched"""
+    closing_date = season_closing_date(f"{season}-{season+1}")
+    if date.today() < closing_date or not os.path.exists(fetch_output):
+        return True
+    fetched = date.fromtimestamp(os.path.getmtime(fetch_output))
+    return fetched < closing_date
+
+
+################################################################################
+# Functions run by the tasks, in worker processes
+################################################################################
+def fetch_season(league: str, season: int, output: str, fetch_workers: int = 1) -> None:
+    """Download all the rounds of a season in the page cache"""
+    url_tag = LEAGUES[league].url_tag
+    scheduler = fetch_scheduler(fetch_workers)
+    season_rounds = discover_season_rounds(
+        [(url_tag, f"{season}-{season+1}")], scheduler
+    )
+    pages = season_round_pages(season_rounds)
+    scheduler.fetch_all([page.request for page in pages])
+    write_atomically(output, json.dumps({"rounds": len(pages)}).encode("utf-8"))
+
+
+def fetch_scheduler(fetch_workers: int) -> DownloadScheduler:
+    """Return a scheduler with a share of the default limits, so that the
+    fetch processes running at the same time stay within them together"""
+    return DownloadScheduler(
+        max_workers=max(1, DEFAULT_MAX_WORKERS // fetch_workers),
+        requests_per_second=DEFAULT_REQUESTS_PER_SECOND / fetch_workers,
+    )
+
+
+def parse_season(league: str, season: int, fetch_output: str, output: str) -> None:
+    """Build the matches data frame of a season from the cached pages"""
+    with open(fetch_output, "r", encoding="utf-8") as file:
+        rounds = json.load(file)["rounds"]
+    url_tag = LEAGUES[league].url_tag
+    pages = season_round_pages({(url_tag, f"{season}-{season+1}"): rounds})
+
+    # This is already a worker process: parse here, reading the cache only
+    scheduler = DownloadScheduler(cache=PageCache(offline=True))
+    page_rows = dict(parse_pages_as_they_arrive(pages, scheduler, parse_workers=0))
+    columns = MatchesColumns()
+    for index, page in enumerate(pages):
+        columns.add_page(page_rows[index], season, page.round_)
+    save_pickle(columns.to_dataframe(), output)
+
+
+def season_results(matches_path: str, output: str) -> None:
+    save_pickle(results_df_from_matches(pd.read_pickle(matches_path)), output)
+
+
+def season_rates(league: str, season: int, results_path: str, output: str) -> None:
+    df_results = pd.read_pickle(results_path)
+    save_pickle(rate_df_from_results(df_results, season, season, league), output)
+
+
+def persist_season(league: str, store_root: str, paths: dict, output: str) -> None:
+    """Save matches, results and rates of a season in the store"""
+    store = DataStore(store_root)
+    for table_name, stage in [
+        ("matches", "parse"),
+        ("results", "results"),
+        ("rates", "rates"),
+    ]:
+        store.save(table_name, pd.read_pickle(paths[stage]), league)
+    write_atomically(output, b"")
+
+
+def plot_league(
+    league: str, start_season: int, end_season: int, store_root: str, output: str
+) -> None:
+    from data_visualization.rendering import league_plot_jobs, render_plots
+
+    seasons = list(range(start_season, end_season + 1))
+    df_rates = rates_from_store(DataStore(store_root), league, seasons)
+    bands = bootstrap_median_bands(rates_index({league: df_rates}), seed=0)
+    jobs = league_plot_jobs(df_rates, league, start_season, end_season, bands=bands)
+    # This is already a worker process: render here
+    render_plots(jobs, 0)
+    write_atomically(output, b"")
+
+
+def plot_across_leagues(
+    leagues: list[str], start_season: int, end_season: int, store_root: str, output: str
+) -> None:
+    from data_visualization.rendering import across_leagues_plot_jobs, render_plots
+
+    store = DataStore(store_root)
+    seasons = list(range(start_season, end_season + 1))
+    rates_data = {
+        league: rates_from_store(store, league, seasons) for league in leagues
+    }
+    index = rates_index(rates_data)
+    bands = bootstrap_median_bands(index, seed=0)
+    jobs = across_leagues_plot_jobs(index, start_season, end_season, bands=bands)
+    render_plots(jobs, 0)
+    write_atomically(output, b"")
+
+
+def save_pickle(df: pd.DataFrame, path: str) -> None:
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    df.to_pickle(temporary_path)
+    os.replace(temporary_path, path)
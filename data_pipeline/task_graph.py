@@ -0,0 +1,138 @@
+"""Run a graph of dependent tasks on one process pool per stage."""
+
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from data_pipeline.instrumentation import METRICS
+
+
+@dataclass(frozen=True)
+class Task:
+    """A unit of work of the pipeline.
+
+    Parameters
+    ----------
+    name : str
+        Unique name of the task, used by other tasks to depend on it.
+    stage : str
+        Stage of the pipeline the task belongs to. Tasks of the same stage run
+        on the same pool of processes.
+    function : Callable
+        Module level function run by the task, called with args.
+    args : tuple
+        Arguments passed to the function.
+    dependencies : tuple[str, ...]
+        Names of the tasks which must be completed before this one starts.
+    output : Optional[str]
+        Path of the file written by the task. If it already exists the task is
+        considered completed and skipped, unless one of its dependencies was
+        run. Tasks without output always run.
+    rerun : bool
+        If True the task runs even when its output exists, as for data which
+        may have changed since the output was written.
+    """
+
+    name: str
+    stage: str
+    function: Callable
+    args: tuple = ()
+    dependencies: tuple[str, ...] = ()
+    output: Optional[str] = None
+    rerun: bool = False
+
+    def run(self) -> Any:
+        if self.output is not None:
+            os.makedirs(os.path.dirname(self.output) or ".", exist_ok=True)
+        return self.function(*self.args)
+
+
+class TaskGraph:
+    def __init__(self, tasks: list[Task]) -> None:
+        """Collection of tasks that can be run respecting their dependencies"""
+        self.tasks = {task.name: task for task in tasks}
+        if len(self.tasks) != len(tasks):
+            raise ValueError("Task names must be unique")
+        for task in tasks:
+            missing = [dep for dep in task.dependencies if dep not in self.tasks]
+            if missing:
+                raise ValueError(f"Task {task.name} depends on unknown {missing}")
+
+    def run(
+        self, stage_workers: Optional[dict[str, int]] = None, force: bool = False
+    ) -> list[str]:
+        """Run all the tasks and return the names of the ones actually run.
+
+        Each stage gets its own process pool, with the number of workers given
+        in stage_workers (one per CPU for the stages not listed). Tasks whose
+        dependencies are completed are started as soon as a worker of their
+        stage is free. With force=True no task is skipped.
+        """
+        stage_workers = stage_workers or {}
+        stages = {task.stage for task in self.tasks.values()}
+        executors: dict[str, Executor] = {
+            stage: ProcessPoolExecutor(max_workers=stage_workers.get(stage))
+            for stage in stages
+        }
+
+        waiting = {name: set(task.dependencies) for name, task in self.tasks.items()}
+        dependents = {name: [] for name in self.tasks}
+        for name, task in self.tasks.items():
+            for dependency in task.dependencies:
+                dependents[dependency].append(name)
+
+        ran, running, started = set(), {}, {}
+        try:
+            while True:
+                ready = [name for name, deps in waiting.items() if not deps]
+                for name in ready:
+                    del waiting[name]
+                    task = self.tasks[name]
+                    if not force and self.is_completed(task, ran):
+                        METRICS.count("tasks skipped")
+                        self.complete(name, waiting, dependents)
+                    else:
+                        print(f"Starting {name}...")
+                        running[executors[task.stage].submit(task.run)] = name
+                        started[name] = time.perf_counter()
+                # Skipped tasks may have made other tasks ready
+                if ready and not running:
+                    continue
+
+                if not running:
+                    if waiting:
+                        raise ValueError(f"Circular dependencies in {list(waiting)}")
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    future.result()
+                    # Measured from the submission, so it includes the wait
+                    # for a free worker of the stage
+                    METRICS.observe(
+                        f"task {self.tasks[name].stage}",
+                        time.perf_counter() - started.pop(name),
+                    )
+                    ran.add(name)
+                    self.complete(name, waiting, dependents)
+        finally:
+            for executor in executors.values():
+                executor.shutdown(cancel_futures=True)
+
+        return sorted(ran)
+
+    def is_completed(self, task: Task, ran: set[str]) -> bool:
+        """Return true if the output of the task is there and up to date"""
+        if task.rerun or task.output is None or not os.path.exists(task.output):
+            return False
+        return not any(dependency in ran for dependency in task.dependencies)
+
+    @staticmethod
+    def complete(
+        name: str, waiting: dict[str, set[str]], dependents: dict[str, list[str]]
+    ) -> None:
+        for dependent in dependents[name]:
+            waiting[dependent].discard(name)
@@ -0,0 +1,157 @@
+"""Refresh the stored data downloading and recomputing only what changed."""
+
+import hashlib
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from data_download.extractor import MatchRow
+from data_download.leagues import LEAGUES, league_from_url_tag
+from data_download.scheduler import DownloadScheduler
+from data_download.constants import MATCHES_COLUMNS
+from data_download.worldfootball import (
+    MatchesColumns,
+    discover_season_rounds,
+    parse_pages_as_they_arrive,
+    season_round_pages,
+)
+from data_elaboration.leaderboard_comparison import rate_df_from_results
+from data_elaboration.results import results_df_from_matches
+from data_storage.store import DataStore, matches_from_store, with_team_categories
+
+DIGESTS_FILE = "round_digests"
+
+
+def refresh_leagues(
+    league_labels: list[str],
+    starting_season: int,
+    ending_season: int,
+    store: DataStore,
+    scheduler: Optional[DownloadScheduler] = None,
+    tolerances: Iterable[int] = range(0, 3),
+) -> dict[str, list[int]]:
+    """Bring matches, results and rates in the store up to date.
+
+    Only the rounds of seasons missing from the store and of stored seasons
+    not complete yet are requested, the latter being revalidated through the
+    page cache. A stored season is complete when it has all the rounds found
+    by discover_season_rounds, each with all its matches played, whatever the
+    date: a season stored before its last matches were played is refreshed
+    until they are.
+    A round is considered changed when its matches differ from the ones of the
+    last refresh. Results and rates are then recomputed for the seasons with at
+    least a changed round only.
+
+    Returns the seasons which were updated, keyed by league label.
+    """
+    scheduler = scheduler or DownloadScheduler()
+    digests = store.load_json(DIGESTS_FILE)
+
+    seasons = list(range(starting_season, ending_season + 1))
+    league_seasons = [
+        (LEAGUES[label].url_tag, f"{season}-{season+1}")
+        for label in league_labels
+        for season in seasons
+    ]
+    season_rounds = discover_season_rounds(league_seasons, scheduler)
+
+    stored_seasons = {}
+    for label in league_labels:
+        stored_seasons[label] = set(store.stored_seasons("matches", label))
+        for season in complete_seasons(store, label, seasons, season_rounds):
+            del season_rounds[(LEAGUES[label].url_tag, f"{season}-{season+1}")]
+    pages = season_round_pages(season_rounds)
+
+    print(f"Checking {len(pages)} rounds for changes...")
+    changed_rounds = {}
+    for index, rows in parse_pages_as_they_arrive(pages, scheduler):
+        page = pages[index]
+        label = league_from_url_tag(page.league_tag).label
+        season_digests = digests.setdefault(label, {}).setdefault(
+            str(page.season_int), {}
+        )
+        digest = rows_digest(rows)
+        is_stored = page.season_int in stored_seasons[label]
+        if is_stored and season_digests.get(str(page.round_)) == digest:
+            continue
+        season_digests[str(page.round_)] = digest
+        changed_rounds.setdefault((label, page.season_int), {})[page.round_] = rows
+
+    updated = {label: [] for label in league_labels}
+    for (label, season), rounds in sorted(changed_rounds.items()):
+        update_season(store, label, season, rounds, tolerances)
+        updated[label].append(season)
+
+    store.save_json(DIGESTS_FILE, digests)
+    print(f"Updated seasons: {updated}")
+    return updated
+
+
+def update_season(
+    store: DataStore,
+    league_label: str,
+    season: int,
+    changed_rounds: dict[int, list[MatchRow]],
+    tolerances: Iterable[int],
+) -> None:
+    """Replace the changed rounds of a season and recompute its results and
+    rates"""
+    columns = MatchesColumns()
+    for round_, rows in sorted(changed_rounds.items()):
+        columns.add_page(rows, season, round_)
+    season_df = columns.to_dataframe()
+
+    if season in store.stored_seasons("matches", league_label):
+        stored_df = matches_from_store(store, league_label, [season])
+        stored_df = stored_df.loc[~stored_df["Round"].isin(changed_rounds), :]
+        # Both frames need the same categories for the concatenation to keep
+        # the team columns categorical, and reading the store may register
+        # teams not in the changed rounds
+        season_df = with_team_categories(season_df)
+        season_df = pd.concat([stored_df, season_df], ignore_index=True)
+        season_df = season_df.sort_values(by="Round", kind="stable", ignore_index=True)
+        season_df = season_df[MATCHES_COLUMNS]
+
+    if season_df.empty:
+        return
+    store.save("matches", season_df, league_label)
+
+    df_results = results_df_from_matches(season_df)
+    df_rates = rate_df_from_results(
+        df_results, season, season, league_label, tolerances
+    )
+    store.save("results", df_results, league_label)
+    store.save("rates", df_rates, league_label)
+
+
+def complete_seasons(
+    store: DataStore,
+    league_label: str,
+    seasons: list[int],
+    season_rounds: dict[tuple[str, str], int],
+) -> list[int]:
+    """Return the stored seasons having all their rounds, as given in
+    season_rounds, with all their matches. Matches not played yet are not
+    stored, so a round still waiting for some of them has too few matches."""
+    stored = sorted(set(seasons) & set(store.stored_seasons("matches", league_label)))
+    if not stored:
+        return []
+    df = store.load("matches", [league_label], stored)
+    matches_per_round = df.groupby(["Season", "Round"], observed=True).size()
+
+    url_tag = LEAGUES[league_label].url_tag
+    output = []
+    for season in stored:
+        rounds = season_rounds[(url_tag, f"{season}-{season+1}")]
+        # In a double round robin every team plays once per round
+        teams = rounds // 2 + 1
+        season_counts = matches_per_round.xs(season, level="Season")
+        season_counts = season_counts.reindex(range(1, rounds + 1), fill_value=0)
+        if (season_counts == teams // 2).all():
+            output.append(season)
+    return output
+
+
+def rows_digest(rows: list[MatchRow]) -> str:
+    """Return a fingerprint of the matches of a round"""
+    return hashlib.sha1(repr(rows).encode("utf-8")).hexdigest()
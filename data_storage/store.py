@@ -0,0 +1,150 @@
+"""Columnar storage of matches, results and rates, partitioned by league and
+season."""
+
+import json
+import os
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from data_download.constants import MATCHES_COLUMNS
+from data_elaboration.teams import TEAMS
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("League", pa.string()), ("Season", pa.int16())]), flavor="hive"
+)
+
+
+class DataStore:
+    def __init__(
+        self,
+        root: str = "saved_dataframes/store",
+        file_format: str = "parquet",
+        memory_map: bool = False,
+    ) -> None:
+        """Store data frames as datasets partitioned by league and season.
+
+        Parameters
+        ----------
+        root : str, optional
+            Folder containing one sub-folder per stored table, by default
+            "saved_dataframes/store".
+        file_format : str, optional
+            Either "parquet" or "feather", by default "parquet".
+        memory_map : bool, optional
+            If True, files are memory mapped when read instead of being copied
+            in memory, which makes reading Feather files almost free.
+        """
+        if file_format not in ("parquet", "feather"):
+            raise ValueError(f"Unknown file format {file_format}")
+        self.root = root
+        self.file_format = file_format
+        self.filesystem = pafs.LocalFileSystem(use_mmap=memory_map)
+
+    def save(self, table_name: str, df: pd.DataFrame, league_label: str) -> None:
+        """Save the data frame of a league, replacing the seasons it contains.
+
+        The data frame must have a "Season" column. The partitions of the other
+        seasons and leagues already in the store are left untouched.
+        """
+        df = df.assign(League=league_label, Season=df["Season"].astype("int16"))
+        ds.write_dataset(
+            pa.Table.from_pandas(df, preserve_index=False),
+            self.table_path(table_name),
+            format=self.file_format,
+            partitioning=PARTITIONING,
+            existing_data_behavior="delete_matching",
+            basename_template="part-{i}." + self.file_format,
+            filesystem=self.filesystem,
+        )
+
+    def load(
+        self,
+        table_name: str,
+        leagues: Optional[list[str]] = None,
+        seasons: Optional[list[int]] = None,
+        columns: Optional[list[str]] = None,
+    ) -> pd.DataFrame:
+        """Read a table, only for the given leagues, seasons and columns.
+
+        Partitions of other leagues and seasons are not read at all, and only
+        the requested columns are read from the files. The "League" column
+        holds the league label of each row.
+        """
+        dataset = self.dataset(table_name)
+
+        filter_ = None
+        if leagues is not None:
+            filter_ = ds.field("League").isin(leagues)
+        if seasons is not None:
+            season_filter = ds.field("Season").isin(seasons)
+            filter_ = season_filter if filter_ is None else filter_ & season_filter
+
+        table = dataset.to_table(columns=columns, filter=filter_)
+        return table.to_pandas()
+
+    def stored_seasons(self, table_name: str, league_label: str) -> list[int]:
+        """Return the seasons of a league found in a table"""
+        if not self.has_table(table_name):
+            return []
+        seasons = self.load(table_name, [league_label], columns=["Season"])["Season"]
+        return sorted(int(season) for season in seasons.unique())
+
+    def load_json(self, name: str) -> dict:
+        """Return the content of a JSON file of the store, empty if missing"""
+        try:
+            with open(self.json_path(name), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def save_json(self, name: str, content: dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.json_path(name), "w", encoding="utf-8") as file:
+            json.dump(content, file, indent=1, sort_keys=True)
+
+    def json_path(self, name: str) -> str:
+        return os.path.join(self.root, name + ".json")
+
+    def has_table(self, table_name: str) -> bool:
+        return os.path.isdir(self.table_path(table_name))
+
+    def dataset(self, table_name: str) -> ds.Dataset:
+        return ds.dataset(
+            self.table_path(table_name),
+            format=self.file_format,
+            partitioning=PARTITIONING,
+            filesystem=self.filesystem,
+        )
+
+    def table_path(self, table_name: str) -> str:
+        return os.path.abspath(os.path.join(self.root, table_name))
+
+
+def matches_from_store(
+    store: DataStore, league_label: str, seasons: list[int]
+) -> pd.DataFrame:
+    """Read the matches of a league from the store, as they were downloaded"""
+    df = store.load("matches", [league_label], seasons)
+    df = df.drop(columns="League").sort_values(
+        by=["Season", "Round"], kind="stable", ignore_index=True
+    )
+    return with_team_categories(df)[MATCHES_COLUMNS]
+
+
+def with_team_categories(df: pd.DataFrame) -> pd.DataFrame:
+    """Make both team columns categorical, with the team IDs as codes"""
+    df["Team 1"], df["Team 2"] = TEAMS.categoricals(df["Team 1"], df["Team 2"])
+    return df
+
+
+def rates_from_store(
+    store: DataStore, league_label: str, seasons: list[int]
+) -> pd.DataFrame:
+    """Read the similarity rates of a league, as returned by
+    rate_df_from_results"""
+    df = store.load("rates", [league_label], seasons).drop(columns="League")
+    return df.sort_values(by=["Season", "Round", "Tolerance"], ignore_index=True)
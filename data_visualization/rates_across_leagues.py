@@ -1,28 +1,43 @@
 """Contains function to plot the similarity rate across different leagues"""
-import matplotlib.pyplot as plt
+from typing import Optional, Union
+
 import matplotlib.ticker as mtick
 import pandas as pd
 
+from data_elaboration.bootstrap import MedianBands
+from data_elaboration.rates_index import RatesIndex, rates_index
+
 from . import tools
 
 
 def visualize_rates_per_round_across_leagues(
-    rates_data: dict[str, pd.DataFrame],
+    rates_data: Union[dict[str, pd.DataFrame], RatesIndex],
     min_season: int,
     max_season: int,
     tolerance: int = 1,
-    rounds: list = range(1, 38),
-):
+    rounds: Optional[list] = None,
+    bands: Optional[MedianBands] = None,
+    file_format: str = "png",
+    dpi: int = 200,
+) -> str:
     """Create a line plot comparing median similarity rates at given rounds for
-    multiple leagues."""
-    _, ax = tools.initialize_plot(1)
-    league_labels = ", ".join(list(rates_data.keys()))
+    multiple leagues. By default all the rounds found in the data are shown,
+    and with bands the confidence band of each median is shaded. Returns the
+    path of the saved file.
+    """
+    index = (
+        rates_data if isinstance(rates_data, RatesIndex) else rates_index(rates_data)
+    )
+    if rounds is None:
+        rounds = index.rounds.tolist()
+    fig, ax = tools.initialize_plot(1)
+    league_labels = ", ".join(index.leagues)
 
     # Adding title and subtitle
     ttl = f"Median leaderboard similarity rate per championship round with tolerance of {tolerance}"
-    plt.suptitle(ttl, y=0.94, ha="center", fontsize=18, weight=700)
+    fig.suptitle(ttl, y=0.94, ha="center", fontsize=18, weight=700)
     sub = tools.league_seasons_string(league_labels, min_season, max_season)
-    plt.title(sub, y=1, x=0.5, fontsize=14, ha="center")
+    ax.set_title(sub, y=1, x=0.5, fontsize=14, ha="center")
 
     # Adding axes titles
     tools.set_y_label(
@@ -37,22 +52,23 @@ def visualize_rates_per_round_across_leagues(
     ax.set_yticks([x / 10 for x in range(1, 11)])
     ax.yaxis.set_major_formatter(mtick.PercentFormatter(xmax=1))
 
-    data = {
-        league: median_per_round(rates_data[league], tolerance, rounds)
-        for league in rates_data
-    }
-    for league in data:
-        ax.plot(
-            rounds, data[league], label=league, marker=".", markersize=15, linewidth=1
+    for league in index.leagues:
+        lines = ax.plot(
+            rounds,
+            index.medians(league, tolerance, rounds),
+            label=league,
+            marker=".",
+            markersize=15,
+            linewidth=1,
         )
+        if bands is not None:
+            lower, upper = bands.band(league, tolerance, rounds)
+            ax.fill_between(rounds, lower, upper, color=lines[0].get_color(), alpha=0.2)
 
     tools.set_grid(ax)
-    tools.add_legend("League")
+    tools.add_legend(ax, "League")
 
-    filename = f"Median similarity rate per round across leagues_{league_labels}_{tolerance}.png"
-    tools.save_file(filename)
-
-
-def median_per_round(df: pd.DataFrame, tolerance: int, rounds: list) -> list[float]:
-    filt = df["Tolerance"] == tolerance
-    return [df.loc[(df["Round"] == round) & filt, "Rate"].median() for round in rounds]
+    filename = (
+        f"Median similarity rate per round across leagues_{league_labels}_{tolerance}"
+    )
+    return tools.save_file(fig, filename, file_format, dpi)
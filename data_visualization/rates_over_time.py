@@ -1,29 +1,41 @@
 """Contains function to plot similarity rates over the course of the seasons."""
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mtick
+from typing import Optional, Union
 
+import matplotlib.ticker as mtick
+import numpy as np
 import pandas as pd
 
+from data_elaboration.rates_index import RatesIndex
+
 from . import tools
 
 
 def visualize_rates_over_time(
-    rates_df: pd.DataFrame,
+    rates: Union[pd.DataFrame, RatesIndex],
     league_label: str,
     min_season: int,
     max_season: int,
-    rounds_list: list[int] = [1, 9, 19, 27, 37],
+    rounds_list: Optional[list[int]] = None,
     tolerance: int = 1,
-) -> None:
+    file_format: str = "png",
+    dpi: int = 200,
+) -> str:
     """Create a line plot for the trend of similarity rates at fixed rounds
-    across multiple seasons"""
-    _, ax = tools.initialize_plot(1)
+    across multiple seasons. By default five rounds evenly spread from the
+    first to the last one in the data are shown. Returns the path of the saved
+    file."""
+    index = tools.as_rates_index(rates, league_label)
+    if rounds_list is None:
+        rounds = index.league_rounds(league_label)
+        rounds_list = sorted(set(np.linspace(min(rounds), max(rounds), 5).round()))
+        rounds_list = [int(round_) for round_ in rounds_list]
+    fig, ax = tools.initialize_plot(1)
 
     # Adding title and subtitle
     ttl = f"Leaderboard similarity rate with tolerance of {tolerance} over different seasons for a sample of rounds"
-    plt.suptitle(ttl, y=0.94, ha="center", fontsize=18, weight=700)
+    fig.suptitle(ttl, y=0.94, ha="center", fontsize=18, weight=700)
     sub = tools.league_seasons_string(league_label, min_season, max_season)
-    plt.title(sub, y=1, x=0.5, fontsize=14, ha="center")
+    ax.set_title(sub, y=1, x=0.5, fontsize=14, ha="center")
 
     # Customizing y axis style
     ax.set_yticks([x / 10 for x in range(1, 11)])
@@ -37,13 +49,11 @@ def visualize_rates_over_time(
     tools.set_grid(ax)
 
     for round_ in rounds_list:
-        filt = (rates_df["Tolerance"] == tolerance) & (rates_df["Round"] == round_)
-        season = rates_df.loc[filt, "Season"]
-        rate = rates_df.loc[filt, "Rate"]
+        season, rate = index.season_series(league_label, tolerance, round_)
         ax.plot(season, rate, label=round_, marker=".", markersize=15, linewidth=1)
 
     # Adding legend
-    tools.add_legend("Rounds")
+    tools.add_legend(ax, "Rounds")
 
-    file_name = f"Similarity Rate over time_{league_label}_{tolerance}.png"
-    tools.save_file(file_name)
+    file_name = f"Similarity Rate over time_{league_label}_{tolerance}"
+    return tools.save_file(fig, file_name, file_format, dpi)
@@ -1,23 +1,38 @@
 """Contains function to plot similarity rates over the course of a season"""
-import matplotlib.pyplot as plt
+from typing import Optional, Union
+
 import matplotlib.ticker as mtick
 import pandas as pd
 
+from data_elaboration.bootstrap import MedianBands
+from data_elaboration.rates_index import RatesIndex
+
 from . import tools
 
 
 def visualize_rates_per_round(
-    rates_df: pd.DataFrame, league_label: str, min_season: int, max_season: int
-) -> None:
+    rates: Union[pd.DataFrame, RatesIndex],
+    league_label: str,
+    min_season: int,
+    max_season: int,
+    bands: Optional[MedianBands] = None,
+    file_format: str = "png",
+    dpi: int = 200,
+) -> str:
     """Create three series of violin plots for three tolerance levels showing
-    similarity rates across rounds."""
-    _, ax = tools.initialize_plot(3)
+    similarity rates across rounds. With bands, the confidence interval of the
+    median is drawn over each violin. Returns the path of the saved file."""
+    index = tools.as_rates_index(rates, league_label)
+    fig, ax = tools.initialize_plot(3)
+    rounds = index.league_rounds(league_label)
+    center = (max(rounds) + 1) / 2
 
     # Adding title and subtitle
     ttl = "Leaderboard similarity rate per championship round with different levels of tolerance"
-    plt.text(s=ttl, y=3.6, x=18, fontsize=16, ha="center", weight=700)
+    # Texts are placed in the coordinates of the last subplot
+    ax[-1].text(s=ttl, y=3.6, x=center, fontsize=16, ha="center", weight=700)
     sub = tools.league_seasons_string(league_label, min_season, max_season)
-    plt.text(s=sub, y=3.5, x=18, fontsize=14, ha="center")
+    ax[-1].text(s=sub, y=3.5, x=center, fontsize=14, ha="center")
 
     # Adding axes titles
     tools.set_y_label(ax[1], "Similarity rate compared with season's final leaderboard")
@@ -25,12 +40,15 @@ def visualize_rates_per_round(
 
     for number in range(0, 3):
         # Plotting data
-        data = data_per_round(rates_df, tolerance=number)
-        ax[number].violinplot(data, showmedians=True)
+        data = index.round_distributions(league_label, number, rounds)
+        ax[number].violinplot(data, positions=rounds, showmedians=True)
+        if bands is not None:
+            lower, upper = bands.band(league_label, number, rounds)
+            ax[number].vlines(rounds, lower, upper, color="black", linewidth=3)
 
         # Customizing the axis
-        ax[number].set_xlim(0, 38)
-        ax[number].set_xticks(range(1, 38))
+        ax[number].set_xlim(0, max(rounds) + 1)
+        ax[number].set_xticks(rounds)
         ax[number].set_ylim(0, 1)
         ax[number].yaxis.set_major_formatter(mtick.PercentFormatter(xmax=1))
 
@@ -40,11 +58,5 @@ def visualize_rates_per_round(
         # Adding grid
         tools.set_grid(ax[number])
 
-    tools.save_file(f"Similarity Rate per round_{league_label}.png")
-
-
-def data_per_round(df: pd.DataFrame, tolerance: int) -> list[list[float]]:
-    return [
-        df.loc[(df["Round"] == round) & (df["Tolerance"] == tolerance), "Rate"].tolist()
-        for round in range(1, 38)
-    ]
+    file_name = f"Similarity Rate per round_{league_label}"
+    return tools.save_file(fig, file_name, file_format, dpi)
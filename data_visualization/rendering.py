@@ -0,0 +1,164 @@
+"""Render batches of plots in parallel, skipping the ones whose data did not
+change since they were last saved."""
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields, is_dataclass
+from typing import Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from data_elaboration.bootstrap import MedianBands
+from data_elaboration.rates_index import RatesIndex, rates_index
+from data_pipeline.instrumentation import METRICS
+
+from . import tools
+from .rates_across_leagues import visualize_rates_per_round_across_leagues
+from .rates_over_time import visualize_rates_over_time
+from .rates_per_round import visualize_rates_per_round
+
+DIGESTS_FOLDER = ".digests"
+
+
+@dataclass(frozen=True)
+class PlotJob:
+    """A call to one of the visualizers.
+
+    Parameters
+    ----------
+    function : Callable
+        Module level visualizer, returning the path of the file it saves.
+    args : tuple
+        Arguments passed to the visualizer. Data frames can appear directly or
+        as values of a dictionary.
+    kwargs : dict
+        Keyword arguments passed to the visualizer, like file_format and dpi.
+    """
+
+    function: Callable
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+
+    def digest(self) -> str:
+        """Return a fingerprint of the visualizer and of all its inputs"""
+        hasher = hashlib.sha1(
+            f"{self.function.__module__}.{self.function.__qualname__}".encode("utf-8")
+        )
+        for value in self.args:
+            update_digest(hasher, value)
+        for key, value in sorted(self.kwargs.items()):
+            update_digest(hasher, key)
+            update_digest(hasher, value)
+        return hasher.hexdigest()
+
+    def render(self) -> str:
+        return self.function(*self.args, **self.kwargs)
+
+
+@METRICS.timed("stage render")
+def render_plots(
+    jobs: list[PlotJob], workers: Optional[int] = None, force: bool = False
+) -> list[str]:
+    """Render the plots and return the paths of the files saved.
+
+    A plot is skipped when its files were saved from the same inputs by a
+    previous run, unless force is True. The other plots are rendered in
+    parallel on a pool of worker processes, one per CPU by default, or in this
+    process when workers is 0.
+    """
+    digests_folder = os.path.join(tools.PLOTS_FOLDER, DIGESTS_FOLDER)
+    os.makedirs(digests_folder, exist_ok=True)
+
+    pending = {}
+    for job in jobs:
+        digest = job.digest()
+        if force or not is_rendered(digests_folder, digest):
+            pending[digest] = job
+    print(f"Rendering {len(pending)} of {len(jobs)} plots...")
+    METRICS.count("plots rendered", len(pending))
+    METRICS.count("plots skipped", len(jobs) - len(pending))
+
+    if workers == 0:
+        paths = [job.render() for job in pending.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(job.render) for job in pending.values()]
+            paths = [future.result() for future in futures]
+
+    for digest, path in zip(pending, paths):
+        with open(os.path.join(digests_folder, digest), "w", encoding="utf-8") as file:
+            json.dump({"path": path}, file)
+    return paths
+
+
+def league_plot_jobs(
+    rates_df: pd.DataFrame,
+    league_label: str,
+    min_season: int,
+    max_season: int,
+    bands: Optional[MedianBands] = None,
+    **options,
+) -> list[PlotJob]:
+    """Return the jobs of the plots of a single league. The options, like
+    file_format and dpi, are passed to every visualizer, the confidence bands
+    of the medians to the ones showing them."""
+    args = (rates_df, league_label, min_season, max_season)
+    return [
+        PlotJob(visualize_rates_per_round, args, {"bands": bands, **options}),
+        PlotJob(visualize_rates_over_time, args, options),
+    ]
+
+
+def across_leagues_plot_jobs(
+    rates_data: Union[dict[str, pd.DataFrame], RatesIndex],
+    min_season: int,
+    max_season: int,
+    tolerances: range = range(0, 3),
+    bands: Optional[MedianBands] = None,
+    **options,
+) -> list[PlotJob]:
+    """Return the jobs of the plots comparing the leagues, one per tolerance.
+    The rates are indexed once for all of them."""
+    if not isinstance(rates_data, RatesIndex):
+        rates_data = rates_index(rates_data)
+    return [
+        PlotJob(
+            visualize_rates_per_round_across_leagues,
+            (rates_data, min_season, max_season, tolerance),
+            {"bands": bands, **options},
+        )
+        for tolerance in tolerances
+    ]
+
+
+def is_rendered(digests_folder: str, digest: str) -> bool:
+    """Return true if a plot with the given digest was saved and is still there"""
+    digest_path = os.path.join(digests_folder, digest)
+    if not os.path.exists(digest_path):
+        return False
+    with open(digest_path, "r", encoding="utf-8") as file:
+        return os.path.exists(json.load(file)["path"])
+
+
+def update_digest(hasher, value) -> None:
+    if isinstance(value, pd.DataFrame):
+        hasher.update(repr(list(value.columns)).encode("utf-8"))
+        hasher.update(pd.util.hash_pandas_object(value, index=False).to_numpy())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        hasher.update(np.ascontiguousarray(value))
+    elif is_dataclass(value):
+        for data_field in fields(value):
+            update_digest(hasher, getattr(value, data_field.name))
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            update_digest(hasher, key)
+            update_digest(hasher, item)
+    elif isinstance(value, (list, tuple)):
+        # Items are hashed one by one, as their repr may abbreviate arrays
+        hasher.update(f"{type(value).__name__} {len(value)}".encode("utf-8"))
+        for item in value:
+            update_digest(hasher, item)
+    else:
+        hasher.update(repr(value).encode("utf-8"))
@@ -1,13 +1,23 @@
+import os
 from typing import Union
-from matplotlib import pyplot as plt
+
+import pandas as pd
 from matplotlib.axes import Axes
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.figure import Figure
 
+from data_elaboration.rates_index import RatesIndex, rates_index
+from data_pipeline.instrumentation import METRICS
+
+PLOTS_FOLDER = "saved_plots"
+
 
 def initialize_plot(number_of_subplots: int) -> tuple[Figure, Axes]:
-    fig, ax = plt.subplots(number_of_subplots)
-    fig.set_size_inches(20, 10)
-    fig.set_dpi(200)
+    """Create a figure drawn by Agg, outside of the pyplot state machine, so
+    that it is freed as soon as it is no longer referenced"""
+    fig = Figure(figsize=(20, 10), dpi=200)
+    FigureCanvasAgg(fig)
+    ax = fig.subplots(number_of_subplots)
     return fig, ax
 
 
@@ -28,14 +38,34 @@ def season_label(season_starting_year: int) -> str:
     return f"{season_starting_year}/{season_starting_year+1}"
 
 
+def as_rates_index(
+    rates: Union[pd.DataFrame, RatesIndex], league_label: str
+) -> RatesIndex:
+    """Return the index of the rates of a league, building it if needed"""
+    if isinstance(rates, RatesIndex):
+        return rates
+    return rates_index({league_label: rates})
+
+
 def set_grid(axes_object: Axes) -> None:
     axes_object.grid(True, linestyle="--")
 
 
-def add_legend(title: Union[str, None]) -> None:
-    plt.legend(title=title, fontsize=13)
+def add_legend(axes_object: Axes, title: Union[str, None]) -> None:
+    axes_object.legend(title=title, fontsize=13)
+
 
+def save_file(
+    fig: Figure, file_name: str, file_format: str = "png", dpi: int = 200
+) -> str:
+    """Save the figure in the plots folder and return the path of the file.
 
-def save_file(file_name: str) -> None:
-    plt.savefig("saved_plots/" + file_name)
-    print(f"File {file_name} saved correctly")
+    file_format can be any format supported by matplotlib, "svg" or a low dpi
+    give light files for previews."""
+    path = os.path.join(PLOTS_FOLDER, f"{file_name}.{file_format}")
+    with METRICS.timer("plot save"):
+        fig.savefig(path, format=file_format, dpi=dpi)
+    if METRICS.enabled:
+        METRICS.count("plot bytes", os.path.getsize(path))
+    print(f"File {os.path.basename(path)} saved correctly")
+    return path
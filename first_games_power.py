@@ -1,42 +1,256 @@
-"""Run the complete similarity rate analysis"""
-from data_download.worldfootball import (
-    seriea_download,
-    premierleague_download,
-    ligue1_download,
-)
-from data_elaboration.leaderboard_comparison import rate_df_from_results
-from data_elaboration.leaderboard_comparison import save_rate_df_to_excel
-from data_elaboration.results import results_df_from_matches
-from data_visualization.rates_over_time import visualize_rates_over_time
-from data_visualization.rates_per_round import visualize_rates_per_round
-from data_visualization.rates_across_leagues import (
-    visualize_rates_per_round_across_leagues,
-)
-
-start_season = 2004
-end_season = 2020
-
-df_matches_seriea = seriea_download()
-df_matches_premier = premierleague_download()
-df_matches_ligue1 = ligue1_download()
-
-matches_data = {
-    "Serie A": df_matches_seriea,
-    "Premier League": df_matches_premier,
-    "Ligue 1": df_matches_ligue1,
-}
-
-rates_data = {}
-for league in matches_data:
-    df_results = results_df_from_matches(matches_data[league])
-    df_rates = rate_df_from_results(df_results, start_season, end_season, league)
-    rates_data[league] = df_rates
-    save_rate_df_to_excel(df_rates, league_label=league)
-
-    visualize_rates_per_round(df_rates, league, start_season, end_season)
-    visualize_rates_over_time(df_rates, league, 2004, 2020)
-
-for tolerance_level in range(0, 3):
-    visualize_rates_per_round_across_leagues(
-        rates_data, start_season, end_season, tolerance_level
+"""Run the complete similarity rate analysis, or some of its stages.
+
+Usage: python first_games_power.py {fetch,compute,plot,all} [--leagues ...]
+    [--start 2004] [--end 2020]
+
+Heavy modules are imported by the stages needing them, so that a run of a
+single stage, like compute, starts without loading the others.
+"""
+import argparse
+from typing import TYPE_CHECKING, Optional
+
+from data_download.leagues import LEAGUES
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from data_storage.store import DataStore
+
+DEFAULT_LEAGUES = ["Serie A", "Premier League", "Ligue 1"]
+START_SEASON = 2004
+END_SEASON = 2020
+
+
+def main(
+    export_excel: bool = False,
+    incremental: bool = False,
+    leagues: Optional[list[str]] = None,
+    start_season: int = START_SEASON,
+    end_season: int = END_SEASON,
+) -> None:
+    """Run the analysis. With incremental=True, only the rounds changed since
+    the last run are downloaded and only their seasons are recomputed, while
+    the spreadsheets, if exported, cover all the seasons."""
+    from data_storage.store import DataStore
+
+    leagues = leagues or DEFAULT_LEAGUES
+    store = DataStore()
+
+    if incremental:
+        fetch(leagues, start_season, end_season, store, export_excel, True)
+        rates_data = stored_rates(leagues, start_season, end_season, store)
+        if export_excel:
+            from data_elaboration.leaderboard_comparison import save_rate_df_to_excel
+
+            for league, df_rates in rates_data.items():
+                save_rate_df_to_excel(df_rates, league_label=league)
+    else:
+        matches_data = fetch(leagues, start_season, end_season, store, export_excel)
+        rates_data = compute(
+            leagues, start_season, end_season, store, export_excel, matches_data
+        )
+    plot(leagues, start_season, end_season, store, rates_data)
+
+
+def fetch(
+    leagues: list[str],
+    start_season: int,
+    end_season: int,
+    store: "DataStore",
+    export_excel: bool = False,
+    incremental: bool = False,
+) -> Optional[dict[str, "pd.DataFrame"]]:
+    """Download the matches missing from the store and return the matches of
+    all the seasons. With incremental=True, refresh instead the rounds changed
+    since the last run, recomputing the results and rates of their seasons."""
+    if incremental:
+        from data_storage.incremental import refresh_leagues
+
+        refresh_leagues(leagues, start_season, end_season, store)
+        if export_excel:
+            from data_download.worldfootball import save_dataframe_to_excel
+            from data_storage.store import matches_from_store
+
+            seasons = list(range(start_season, end_season + 1))
+            for league in leagues:
+                matches = matches_from_store(store, league, seasons)
+                save_dataframe_to_excel(matches, league)
+        return None
+
+    from data_download.worldfootball import leagues_download
+
+    return leagues_download(
+        leagues, start_season, end_season, export_excel, store=store
+    )
+
+
+def compute(
+    leagues: list[str],
+    start_season: int,
+    end_season: int,
+    store: "DataStore",
+    export_excel: bool = False,
+    matches_data: Optional[dict[str, "pd.DataFrame"]] = None,
+) -> dict[str, "pd.DataFrame"]:
+    """Compute results and rates of all the seasons, save them in the store and
+    return the rates. The matches are read from the store if not provided."""
+    from data_elaboration.leaderboard_comparison import (
+        rate_df_from_results,
+        save_rate_df_to_excel,
     )
+    from data_elaboration.results import results_df_from_matches
+
+    seasons = list(range(start_season, end_season + 1))
+    if matches_data is None:
+        from data_storage.store import matches_from_store
+
+        check_stored(store, "matches", leagues, seasons, "fetch")
+        matches_data = {
+            league: matches_from_store(store, league, seasons) for league in leagues
+        }
+
+    rates_data = {}
+    for league in leagues:
+        df_results = results_df_from_matches(matches_data[league])
+        df_rates = rate_df_from_results(df_results, start_season, end_season, league)
+        rates_data[league] = df_rates
+        store.save("results", df_results, league)
+        store.save("rates", df_rates, league)
+        if export_excel:
+            save_rate_df_to_excel(df_rates, league_label=league)
+    return rates_data
+
+
+def plot(
+    leagues: list[str],
+    start_season: int,
+    end_season: int,
+    store: "DataStore",
+    rates_data: Optional[dict[str, "pd.DataFrame"]] = None,
+) -> list[str]:
+    """Render the plots of the rates and return the paths of the files saved.
+    The rates are read from the store if not provided."""
+    from data_elaboration.bootstrap import bootstrap_median_bands
+    from data_elaboration.rates_index import rates_index
+    from data_visualization.rendering import (
+        across_leagues_plot_jobs,
+        league_plot_jobs,
+        render_plots,
+    )
+
+    if rates_data is None:
+        rates_data = stored_rates(leagues, start_season, end_season, store)
+
+    # A fixed seed keeps the bands, and so the plots, unchanged across runs
+    index = rates_index(rates_data)
+    bands = bootstrap_median_bands(index, seed=0)
+    plot_jobs = across_leagues_plot_jobs(index, start_season, end_season, bands=bands)
+    for league, df_rates in rates_data.items():
+        plot_jobs += league_plot_jobs(
+            df_rates, league, start_season, end_season, bands=bands
+        )
+    return render_plots(plot_jobs)
+
+
+def stored_rates(
+    leagues: list[str],
+    start_season: int,
+    end_season: int,
+    store: "DataStore",
+) -> dict[str, "pd.DataFrame"]:
+    """Read the rates of all the seasons from the store, keyed by league"""
+    from data_storage.store import rates_from_store
+
+    seasons = list(range(start_season, end_season + 1))
+    check_stored(store, "rates", leagues, seasons, "compute")
+    return {league: rates_from_store(store, league, seasons) for league in leagues}
+
+
+def check_stored(
+    store: "DataStore",
+    table: str,
+    leagues: list[str],
+    seasons: list[int],
+    stage: str,
+) -> None:
+    """Raise a ValueError naming the stage to run if any season is missing"""
+    for league in leagues:
+        missing = sorted(set(seasons) - set(store.stored_seasons(table, league)))
+        if missing:
+            raise ValueError(
+                f"No {table} of {league} in the store for seasons {missing}, "
+                f"run the {stage} stage first"
+            )
+
+
+def parse_arguments(arguments: Optional[list[str]] = None) -> argparse.Namespace:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--leagues",
+        nargs="+",
+        choices=list(LEAGUES),
+        default=DEFAULT_LEAGUES,
+        metavar="LEAGUE",
+        help=f"Leagues to analyse, among {', '.join(LEAGUES)}",
+    )
+    common.add_argument("--start", type=int, default=START_SEASON, help="First season")
+    common.add_argument("--end", type=int, default=END_SEASON, help="Last season")
+    common.add_argument("--metrics", help="Save the metrics of the run as JSON")
+    common.add_argument("--profile", help="Save cProfile statistics of the run")
+    common.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Add the peak memory traced by tracemalloc to --metrics",
+    )
+    excel = argparse.ArgumentParser(add_help=False)
+    excel.add_argument("--excel", action="store_true", help="Export to Excel")
+    incremental = argparse.ArgumentParser(add_help=False)
+    incremental.add_argument(
+        "--incremental", action="store_true", help="Only refresh changed rounds"
+    )
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    stages = parser.add_subparsers(dest="stage", required=True)
+    stages.add_parser(
+        "fetch", parents=[common, excel, incremental], help="Download the matches"
+    )
+    stages.add_parser(
+        "compute", parents=[common, excel], help="Compute results and rates"
+    )
+    stages.add_parser("plot", parents=[common], help="Plot the rates")
+    stages.add_parser(
+        "all", parents=[common, excel, incremental], help="Run all the stages"
+    )
+
+    options = parser.parse_args(arguments)
+    if options.start > options.end:
+        parser.error("--start must not be after --end")
+    if options.trace_memory and not options.metrics:
+        parser.error("--trace-memory adds to the metrics, pass --metrics too")
+    return options
+
+
+def run_stage(options: argparse.Namespace) -> None:
+    from data_storage.store import DataStore
+
+    seasons = (options.leagues, options.start, options.end)
+    if options.stage == "all":
+        main(options.excel, options.incremental, *seasons)
+    elif options.stage == "fetch":
+        fetch(*seasons, DataStore(), options.excel, options.incremental)
+    elif options.stage == "compute":
+        compute(*seasons, DataStore(), options.excel)
+    else:
+        plot(*seasons, DataStore())
+
+
+# Parsing runs in worker processes, which must not rerun the analysis
+if __name__ == "__main__":
+    options = parse_arguments()
+    if options.metrics or options.profile:
+        from data_pipeline.instrumentation import instrumented
+
+        with instrumented(options.metrics, options.profile, options.trace_memory):
+            run_stage(options)
+    else:
+        run_stage(options)
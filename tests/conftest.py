@@ -0,0 +1,81 @@
+"""Fixtures shared by the tests."""
+
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import pytest
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Local stand-in for worldfootball.net serving the pages in self.pages,
+    keyed by path, with ETags so that conditional requests get a 304.
+
+    Errors queued in self.failures, as (status code, headers) per path, are
+    answered first, one per request, and requests to the paths in self.delays
+    are answered after that many seconds.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.pages: dict[str, bytes] = {}
+        self.failures: dict[str, list[tuple[int, dict[str, str]]]] = {}
+        self.delays: dict[str, float] = {}
+        self.requests: list[str] = []
+        self.lock = threading.Lock()
+
+    def next_failure(self, path: str) -> Optional[tuple[int, dict[str, str]]]:
+        with self.lock:
+            failures = self.failures.get(path)
+            return failures.pop(0) if failures else None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delays.get(self.path, 0))
+        failure = self.server.next_failure(self.path)
+        if failure is not None:
+            status_code, headers = failure
+            self.send_response(status_code)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        content = self.server.pages.get(self.path)
+        if content is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,24 @@
+import pytest
+
+from data_download.extractor import MatchRow, rows_from_cells
+
+
+def test_rows_pair_teams_with_scores():
+    cells = ["Inter", "Milan", "2:1 (1:0) ", "Roma", "Lazio", " abor."]
+    assert rows_from_cells(cells) == [
+        MatchRow("Inter", "Milan", 2, 1, "played"),
+        MatchRow("Roma", "Lazio", 0, 0, "aborted"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "cells",
+    [
+        ["Inter", "Milan", "2:1 (1:0) ", "Roma", "Lazio"],
+        ["Inter", "Milan", "2:1 (1:0) ", "Roma", "1:1 (0:0) "],
+        ["Inter", "Milan", "Roma", "2:1 (1:0) "],
+    ],
+)
+def test_mismatched_teams_and_scores_raise(cells):
+    with pytest.raises(ValueError):
+        rows_from_cells(cells)
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+COMPUTE_IMPORTS = """
+import sys
+from data_elaboration.leaderboard_comparison import rate_df_from_results
+from data_elaboration.results import results_df_from_matches
+from data_storage.store import matches_from_store
+print(sorted({"requests", "regex"} & set(sys.modules)))
+"""
+
+
+def test_compute_stage_does_not_import_download_modules():
+    output = subprocess.run(
+        [sys.executable, "-c", COMPUTE_IMPORTS],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert output.strip() == "[]"
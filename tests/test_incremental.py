@@ -0,0 +1,60 @@
+from datetime import date
+
+import pandas as pd
+
+from benchmarks.synthetic import round_page
+from data_download import worldfootball
+from data_download.page_cache import PageCache
+from data_download.scheduler import DownloadScheduler
+from data_storage.incremental import refresh_leagues
+from data_storage.store import DataStore
+
+# A season still in progress, so that the result cannot depend on the date
+SEASON = date.today().year
+TEAMS = ["Inter", "Milan", "Roma", "Lazio"]
+# Double round robin of four teams: six rounds of two matches
+FIXTURES = [(0, 1), (2, 3), (0, 2), (1, 3), (0, 3), (1, 2)]
+
+
+def serve_season(server, last_score: str) -> None:
+    """Serve the rounds of the season, the last match having last_score"""
+    fixtures = FIXTURES + [(away, home) for home, away in FIXTURES]
+    for round_ in range(1, 7):
+        matches = fixtures[2 * round_ - 2 : 2 * round_]
+        scores = ["1:0 (0:0) ", last_score if round_ == 6 else "2:2 (1:1) "]
+        df_round = pd.DataFrame(
+            {
+                "Team 1": [TEAMS[home] for home, _ in matches],
+                "Team 2": [TEAMS[away] for _, away in matches],
+                "Score": scores,
+            }
+        )
+        path = f"/schedule/ita-serie-a-{SEASON}-{SEASON + 1}-spieltag/{round_}/"
+        server.pages[path] = round_page(df_round)
+
+
+def test_season_is_refreshed_until_complete(stand_in_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(worldfootball, "WORLDFOOTBALL_URL", stand_in_server.url)
+    scheduler = DownloadScheduler(
+        requests_per_second=None, cache=PageCache(str(tmp_path / "pages"))
+    )
+    store = DataStore(str(tmp_path / "store"))
+
+    serve_season(stand_in_server, last_score="-:-")
+    assert refresh_leagues(["Serie A"], SEASON, SEASON, store, scheduler) == {
+        "Serie A": [SEASON]
+    }
+    assert len(store.load("matches", ["Serie A"], [SEASON])) == 11
+
+    serve_season(stand_in_server, last_score="3:1 (2:0) ")
+    assert refresh_leagues(["Serie A"], SEASON, SEASON, store, scheduler) == {
+        "Serie A": [SEASON]
+    }
+    assert len(store.load("matches", ["Serie A"], [SEASON])) == 12
+
+    # Complete: only the first round is read to find the number of rounds
+    stand_in_server.requests.clear()
+    assert refresh_leagues(["Serie A"], SEASON, SEASON, store, scheduler) == {
+        "Serie A": []
+    }
+    assert len(stand_in_server.requests) == 1
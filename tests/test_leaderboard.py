@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from data_elaboration.leaderboard import Leaderboard
+
+
+@pytest.fixture
+def results():
+    return pd.DataFrame(
+        {
+            "Team": ["Alba", "Brava", "Corsa", "Dora"],
+            "Season": [2004] * 4,
+            "Round": [1] * 4,
+            "Points earned": [3, 0, 1, 1],
+        }
+    )
+
+
+def test_rank_from_team(results):
+    leaderboard = Leaderboard(results, 2004)
+    assert leaderboard.get_rank_from_team("Alba") == 1
+    assert leaderboard.get_rank_from_team("Dora") == 2
+    with pytest.raises(KeyError):
+        Leaderboard(results, 2004, ranks_range=(None, 1)).get_rank_from_team("Dora")
+
+
+def test_empty_leaderboard_raises_key_error(results):
+    leaderboard = Leaderboard(results, 2004, ranks_range=(5, None))
+    assert leaderboard.team_ids.size == 0
+    with pytest.raises(KeyError):
+        leaderboard.get_rank_from_team("Alba")
@@ -0,0 +1,68 @@
+import json
+from datetime import date
+
+from data_download import worldfootball
+from data_download.page_cache import PageCache
+from data_download.scheduler import DownloadScheduler
+from data_download.worldfootball import RoundPage
+
+SEASON = "2019-2020"
+ROUND_PATH = f"/schedule/ita-serie-a-{SEASON}-spieltag/30/"
+
+
+def make_scheduler(cache_directory) -> DownloadScheduler:
+    return DownloadScheduler(
+        requests_per_second=None, cache=PageCache(str(cache_directory))
+    )
+
+
+def set_download_day(cache: PageCache, url: str, day: date) -> None:
+    _, metadata = cache.load(url)
+    cache.store_metadata(url, {**metadata, "downloaded": day.isoformat()})
+
+
+def test_page_downloaded_before_the_season_closed_is_revalidated(
+    stand_in_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(worldfootball, "WORLDFOOTBALL_URL", stand_in_server.url)
+    scheduler = make_scheduler(tmp_path)
+    request = RoundPage("ita-serie-a", SEASON, 30).request
+
+    stand_in_server.pages[ROUND_PATH] = b"postponed"
+    assert scheduler.fetch(request) == b"postponed"
+    # As if cached in the middle of the season
+    set_download_day(scheduler.cache, request.url, date(2020, 3, 1))
+
+    stand_in_server.pages[ROUND_PATH] = b"played"
+    assert scheduler.fetch(request) == b"played"
+    assert len(stand_in_server.requests) == 2
+
+
+def test_page_downloaded_after_the_season_closed_is_final(
+    stand_in_server, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(worldfootball, "WORLDFOOTBALL_URL", stand_in_server.url)
+    scheduler = make_scheduler(tmp_path)
+    request = RoundPage("ita-serie-a", SEASON, 30).request
+
+    stand_in_server.pages[ROUND_PATH] = b"played"
+    scheduler.fetch(request)
+    stand_in_server.pages[ROUND_PATH] = b"changed"
+    assert scheduler.fetch(request) == b"played"
+    assert len(stand_in_server.requests) == 1
+
+
+def test_unchanged_page_is_marked_as_revalidated(stand_in_server, tmp_path):
+    cache = PageCache(str(tmp_path))
+    url = f"{stand_in_server.url}/page/"
+    stand_in_server.pages["/page/"] = b"content"
+    cache.get(url)
+    set_download_day(cache, url, date(2020, 3, 1))
+
+    assert cache.get(url, final_after=date(2020, 7, 1)) == b"content"
+    assert cache.get(url, final_after=date(2020, 7, 1)) == b"content"
+    # One download, one revalidation answered with 304, then no request
+    assert len(stand_in_server.requests) == 2
+    _, metadata_path = cache.paths(url)
+    with open(metadata_path, encoding="utf-8") as file:
+        assert json.load(file)["downloaded"] == date.today().isoformat()
@@ -0,0 +1,42 @@
+import numpy as np
+
+from data_elaboration.bootstrap import MedianBands
+from data_visualization.rendering import PlotJob
+from data_visualization.rates_across_leagues import (
+    visualize_rates_per_round_across_leagues,
+)
+
+
+def median_bands(lower: np.ndarray) -> MedianBands:
+    return MedianBands(
+        leagues=[f"League {i}" for i in range(lower.shape[0])],
+        tolerances=np.arange(lower.shape[1]),
+        rounds=np.arange(1, lower.shape[2] + 1),
+        lower=lower,
+        upper=lower + 0.1,
+        level=0.95,
+        resamples=100,
+    )
+
+
+def digest_with_bands(bands: MedianBands) -> str:
+    job = PlotJob(
+        visualize_rates_per_round_across_leagues,
+        (None, 2004, 2020, 1),
+        {"bands": bands},
+    )
+    return job.digest()
+
+
+def test_digest_changes_with_bands():
+    # Large enough for numpy to abbreviate the arrays in their repr
+    lower = np.random.default_rng(0).random((10, 3, 38))
+    changed = lower.copy()
+    changed[5, 1, 20] += 0.5
+    slightly_changed = lower.copy()
+    slightly_changed[0, 0, 0] += 1e-12
+
+    digest = digest_with_bands(median_bands(lower))
+    assert digest == digest_with_bands(median_bands(lower.copy()))
+    assert digest != digest_with_bands(median_bands(changed))
+    assert digest != digest_with_bands(median_bands(slightly_changed))
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_elaboration.results import goals_from_scores, long_results
+from data_elaboration.teams import TEAMS
+from data_storage.store import with_team_categories
+
+
+def test_goals_from_scores():
+    scores = pd.Series(["2:1 (1:0) ", "0:3 (0:1) ", "2:1 (2:0) ", "3:2 dec."])
+    expected = [[2, 1], [0, 3], [2, 1], [3, 2]]
+    np.testing.assert_array_equal(goals_from_scores(scores), expected)
+
+
+def test_void_scores_count_as_draws():
+    scores = pd.Series(["2:1 (1:0) ", " abor.", " dnp"])
+    np.testing.assert_array_equal(goals_from_scores(scores), [[2, 1], [0, 0], [0, 0]])
+
+
+def test_unknown_scores_raise():
+    with pytest.raises(ValueError):
+        goals_from_scores(pd.Series(["2:1 (1:0) ", "postponed"]))
+
+
+def test_team_columns_share_categories():
+    df = with_team_categories(
+        pd.DataFrame({"Team 1": ["Alba", "Brava"], "Team 2": ["Corsa", "Dora"]})
+    )
+    assert df["Team 1"].dtype == df["Team 2"].dtype
+    teams = pd.concat([df["Team 1"], df["Team 2"]], ignore_index=True)
+    assert isinstance(teams.dtype, pd.CategoricalDtype)
+
+
+def test_long_results_keeps_team_categories():
+    df = pd.DataFrame(
+        {
+            "Team 1": ["Alba", "Brava"],
+            "Team 2": ["Corsa", "Dora"],
+            "Season": [2020, 2020],
+            "Round": [1, 1],
+        }
+    )
+    results = long_results(df, np.array([3, 1]), np.array([0, 1]))
+    assert isinstance(results["Team"].dtype, pd.CategoricalDtype)
+    assert results["Team"].tolist() == ["Alba", "Brava", "Corsa", "Dora"]
+    assert results["Team"].cat.codes.tolist() == TEAMS.intern(results["Team"]).tolist()
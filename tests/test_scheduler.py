@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+from data_download.page_cache import PageCache
+from data_download.scheduler import DownloadError, DownloadScheduler, PageRequest
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    return DownloadScheduler(
+        max_workers=4,
+        requests_per_second=None,
+        max_retries=2,
+        backoff=0.01,
+        cache=PageCache(str(tmp_path / "pages")),
+    )
+
+
+def serve_pages(server, count: int) -> list[PageRequest]:
+    for index in range(count):
+        server.pages[f"/page/{index}"] = f"page {index}".encode("utf-8")
+    return [PageRequest(f"{server.url}/page/{index}") for index in range(count)]
+
+
+@pytest.mark.parametrize("status_code", [429, 500, 502, 503, 504])
+def test_failed_requests_are_retried(stand_in_server, scheduler, status_code):
+    [request] = serve_pages(stand_in_server, 1)
+    stand_in_server.failures["/page/0"] = [(status_code, {})] * 2
+
+    assert scheduler.fetch(request) == b"page 0"
+    assert stand_in_server.requests == ["/page/0"] * 3
+
+
+def test_retry_after_is_respected(stand_in_server, scheduler):
+    [request] = serve_pages(stand_in_server, 1)
+    stand_in_server.failures["/page/0"] = [(429, {"Retry-After": "1"})]
+
+    start = time.perf_counter()
+    assert scheduler.fetch(request) == b"page 0"
+    assert time.perf_counter() - start >= 1
+
+
+def test_download_error_after_the_last_attempt(stand_in_server, scheduler):
+    [request] = serve_pages(stand_in_server, 1)
+    stand_in_server.failures["/page/0"] = [(503, {})] * 3
+
+    with pytest.raises(DownloadError):
+        scheduler.fetch(request)
+    assert len(stand_in_server.requests) == 3
+    assert scheduler.cache.load(request.url) is None
+
+
+def test_results_follow_the_order_of_the_requests(stand_in_server, scheduler):
+    requests = serve_pages(stand_in_server, 8)
+    # The first pages arrive last
+    for index in range(3):
+        stand_in_server.delays[f"/page/{index}"] = 0.2 - 0.05 * index
+
+    expected = [f"page {index}".encode("utf-8") for index in range(8)]
+    assert scheduler.fetch_all(requests) == expected
+
+
+def test_iter_fetch_does_not_run_ahead_of_the_consumer(stand_in_server, tmp_path):
+    scheduler = DownloadScheduler(
+        max_workers=1, requests_per_second=None, cache=PageCache(str(tmp_path))
+    )
+    requests = serve_pages(stand_in_server, 10)
+
+    pages = scheduler.iter_fetch(requests)
+    next(pages)
+    time.sleep(0.2)
+    assert len(stand_in_server.requests) <= 2 * scheduler.max_workers
+
+    received = {index for index, _ in pages} | {0}
+    assert len(received) == 10
+
+
+def test_fetch_all_async(stand_in_server, scheduler):
+    requests = serve_pages(stand_in_server, 6)
+    stand_in_server.delays["/page/0"] = 0.1
+
+    pages = asyncio.run(scheduler.fetch_all_async(requests))
+    assert pages == [f"page {index}".encode("utf-8") for index in range(6)]
@@ -0,0 +1,25 @@
+import numpy as np
+
+from data_elaboration.leaderboard_comparison import similarity_rates
+
+
+def test_similarity_rates_count_teams_within_tolerance():
+    partial = np.array([[1, 2, 3, 4], [4, 3, 2, 1]])
+    final = np.array([1, 2, 3, 4])
+    rates = similarity_rates(partial, final, range(0, 4))
+    np.testing.assert_allclose(rates, [[1, 1, 1, 1], [0, 0.5, 0.5, 1]])
+
+
+def test_large_rank_differences_of_few_teams_are_not_clipped():
+    # Two teams compared, with their ranks in tables of 20 teams
+    partial = np.array([[1, 20]])
+    final = np.array([20, 1])
+    rates = similarity_rates(partial, final, [1, 5, 18, 19])
+    np.testing.assert_allclose(rates, [[0, 0, 0, 1]])
+
+
+def test_masked_teams_are_not_compared():
+    partial = np.array([[1, 20, 2]])
+    final = np.array([1, 2, 20])
+    mask = np.array([True, False, False])
+    np.testing.assert_allclose(similarity_rates(partial, final, [0, 5], mask), [[1, 1]])
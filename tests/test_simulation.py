@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_leagues
+from data_elaboration.simulation import simulate_season
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_simulation_does_not_depend_on_the_workers(workers):
+    df_matches = synthetic_leagues(leagues=1, seasons=1)["League 1"]
+    inline = simulate_season(df_matches, 2004, 30, simulations=15_000, seed=1)
+    parallel = simulate_season(
+        df_matches, 2004, 30, simulations=15_000, seed=1, workers=workers
+    )
+    np.testing.assert_array_equal(
+        inline.rank_probabilities, parallel.rank_probabilities
+    )
+    np.testing.assert_allclose(inline.rank_probabilities.sum(axis=0).sum(), 20)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from data_elaboration.standings import rank_range_mask
+
+RANKS = np.arange(1, 11)
+
+
+@pytest.mark.parametrize(
+    "ranks_range, expected",
+    [
+        ((None, 4), [1, 2, 3, 4]),
+        ((-3, None), [8, 9, 10]),
+        ((2, -8), [2, 3]),
+        ((None, None), list(range(1, 11))),
+    ],
+)
+def test_rank_range_mask(ranks_range, expected):
+    assert RANKS[rank_range_mask(RANKS, ranks_range, 10)].tolist() == expected
+
+
+@pytest.mark.parametrize("ranks_range", [(0, 4), (None, 0)])
+def test_zero_rank_bound_raises(ranks_range):
+    with pytest.raises(ValueError):
+        rank_range_mask(RANKS, ranks_range, 10)
@@ -0,0 +1,48 @@
+import os
+
+from data_download.scheduler import DEFAULT_MAX_WORKERS, DEFAULT_REQUESTS_PER_SECOND
+from data_pipeline.runner import fetch_scheduler
+from data_pipeline.task_graph import Task, TaskGraph
+
+
+def append_line(path: str, output: str) -> None:
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("run\n")
+    with open(output, "w", encoding="utf-8") as file:
+        file.write("done")
+
+
+def test_completed_tasks_are_skipped_unless_rerun(tmp_path):
+    log = str(tmp_path / "log")
+    tasks = [
+        Task(
+            "a",
+            "stage",
+            append_line,
+            (log, str(tmp_path / "a" / "out")),
+            (),
+            str(tmp_path / "a" / "out"),
+        ),
+        Task(
+            "b",
+            "stage",
+            append_line,
+            (log, str(tmp_path / "b" / "nested" / "out")),
+            output=str(tmp_path / "b" / "nested" / "out"),
+            rerun=True,
+        ),
+    ]
+    stage_workers = {"stage": 1}
+    assert TaskGraph(tasks).run(stage_workers) == ["a", "b"]
+    assert os.path.exists(tmp_path / "b" / "nested" / "out")
+    assert TaskGraph(tasks).run(stage_workers) == ["b"]
+
+
+def test_fetch_processes_share_the_download_limits():
+    single = fetch_scheduler(1)
+    assert single.max_workers == DEFAULT_MAX_WORKERS
+    assert single.rate_limiter.interval == 1 / DEFAULT_REQUESTS_PER_SECOND
+
+    shared = fetch_scheduler(4)
+    assert shared.max_workers * 4 <= DEFAULT_MAX_WORKERS
+    assert shared.rate_limiter.interval == 4 / DEFAULT_REQUESTS_PER_SECOND